@@ -1,6 +1,19 @@
+import sys
+
 from bake.exceptions import RequiredParameterError
-from bake.path import *
 from bake.task import *
 from bake.util import import_object
 
-import bake.lib
+__all__ = ('FilePath', 'Path', 'RequiredParameterError', 'Task', 'TaskError', 'declare',
+    'import_object', 'parameter', 'requires', 'task')
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name not in ('FilePath', 'Path'):
+            raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+        from bake import path
+        globals().update(FilePath=path.FilePath, Path=path.Path)
+        return globals()[name]
+else:
+    from bake.path import *
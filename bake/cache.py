@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+from threading import RLock
+
+from bake.appdirs import user_cache_dir
+
+__all__ = ('ResultCache', 'State', 'get_cache_path', 'get_project_key', 'hash_file')
+
+def ensure_directory(directory):
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+
+def get_cache_path(*segments):
+    return os.path.join(user_cache_dir('bake'), *segments)
+
+def get_project_key(project):
+    return hashlib.sha1(os.path.abspath(project).encode('utf8')).hexdigest()[:16]
+
+def hash_file(path, algorithm='sha1', blocksize=65536):
+    digest = hashlib.new(algorithm)
+    openfile = open(path, 'rb')
+    try:
+        block = openfile.read(blocksize)
+        while block:
+            digest.update(block)
+            block = openfile.read(blocksize)
+    finally:
+        openfile.close()
+    return digest.hexdigest()
+
+def write_atomically(path, content):
+    from tempfile import mkstemp
+
+    directory = os.path.dirname(path)
+    ensure_directory(directory)
+
+    fileno, filename = mkstemp('.tmp', os.path.basename(path) + '.', directory)
+    try:
+        try:
+            while content:
+                content = content[os.write(fileno, content):]
+        finally:
+            os.close(fileno)
+        os.rename(filename, path)
+    except BaseException:
+        try:
+            os.unlink(filename)
+        except OSError:
+            pass
+        raise
+
+class State(object):
+    """A JSON document, scoped to a project path, which persists between invocations of bake
+    within the bake cache directory."""
+
+    def __init__(self, name, project):
+        key = get_project_key(project)
+        self.data = None
+        self.dirty = False
+        self.lock = RLock()
+        self.path = get_cache_path(name, key + '.json')
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self._load().get(key, default)
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            try:
+                write_atomically(self.path, json.dumps(self.data).encode('utf8'))
+            except (IOError, OSError):
+                pass
+            else:
+                self.dirty = False
+
+    def set(self, key, value):
+        with self.lock:
+            self._load()[key] = value
+            self.dirty = True
+
+    def _load(self):
+        if self.data is None:
+            try:
+                openfile = open(self.path)
+                try:
+                    self.data = json.load(openfile)
+                finally:
+                    openfile.close()
+            except (IOError, OSError, ValueError):
+                self.data = {}
+        return self.data
+
+class ResultCache(object):
+    """A content-addressed store of the outputs and reported messages of task executions, keyed
+    by a digest of everything which determines the result of a task.
+
+    Each output file is stored once as an object named by its own digest; an entry for a given
+    key lists the objects and file modes of the outputs along with the captured messages. On
+    restoration, outputs are copied from the store, so that later modification of a restored
+    output cannot corrupt the store.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or get_cache_path('results')
+
+    def restore(self, key, path=None):
+        import shutil
+        try:
+            openfile = open(self._entry_path(key))
+            try:
+                entry = json.load(openfile)
+            finally:
+                openfile.close()
+        except (IOError, OSError, ValueError):
+            return None
+
+        for filename, (digest, mode) in entry['outputs'].items():
+            if not os.path.exists(self._object_path(digest)):
+                return None
+
+        for filename, (digest, mode) in entry['outputs'].items():
+            filename = self._resolve(filename, path)
+            directory = os.path.dirname(filename)
+            if directory:
+                ensure_directory(directory)
+            if os.path.lexists(filename):
+                os.unlink(filename)
+
+            shutil.copyfile(self._object_path(digest), filename)
+            os.chmod(filename, mode)
+
+        return entry['messages']
+
+    def store(self, key, filenames, messages, path=None):
+        import shutil
+        from tempfile import mkstemp
+
+        outputs = {}
+        for name in filenames:
+            filename = self._resolve(name, path)
+            digest = hash_file(filename)
+            target = self._object_path(digest)
+            if not os.path.exists(target):
+                directory = os.path.dirname(target)
+                ensure_directory(directory)
+                fileno, temporary = mkstemp('.tmp', 'bake', directory)
+                os.close(fileno)
+                shutil.copyfile(filename, temporary)
+                os.rename(temporary, target)
+            outputs[name] = [digest, os.stat(filename).st_mode & 0o7777]
+
+        entry = {'outputs': outputs, 'messages': messages}
+        write_atomically(self._entry_path(key), json.dumps(entry).encode('utf8'))
+
+    def _entry_path(self, key):
+        return os.path.join(self.root, 'entries', key[:2], key[2:] + '.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest[2:])
+
+    def _resolve(self, filename, path):
+        if path:
+            return os.path.join(path, filename)
+        return filename
@@ -1,22 +1,6 @@
 import re
 
-try:
-    import colorama
-except ImportError:
-    colorama = Tokens = Reset = None
-else:
-    from colorama import Fore, Back, Style
-    colorama.init()
-
-    Tokens = {
-        'b': Fore.BLUE,
-        'c': Fore.CYAN,
-        'g': Fore.GREEN,
-        'm': Fore.MAGENTA,
-        'r': Fore.RED,
-        'y': Fore.YELLOW,
-    }
-    Reset = Style.RESET_ALL
+colorama = Style = Tokens = Reset = None
 
 TokenPattern = re.compile(r'\[!([bcgmryBCGMRY])?\]')
 
@@ -31,8 +15,33 @@ def _replace_tokens(match):
     else:
         return replacement
 
+def load_colorama():
+    global colorama, Style, Tokens, Reset
+    if colorama is not None:
+        return colorama
+
+    try:
+        import colorama
+    except ImportError:
+        colorama = False
+        return colorama
+
+    from colorama import Fore, Style
+    colorama.init()
+
+    Tokens = {
+        'b': Fore.BLUE,
+        'c': Fore.CYAN,
+        'g': Fore.GREEN,
+        'm': Fore.MAGENTA,
+        'r': Fore.RED,
+        'y': Fore.YELLOW,
+    }
+    Reset = Style.RESET_ALL
+    return colorama
+
 def ansify(value, colorize=False, reset=True):
-    if colorama and colorize:
+    if colorize and load_colorama():
         value = TokenPattern.sub(_replace_tokens, value)
         if reset:
             value += Reset
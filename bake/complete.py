@@ -0,0 +1,89 @@
+"""Support for ``bake --complete``, which writes the candidates for the last word of a partial
+invocation, one per line, for use by the shell completion scripts in ``contrib/completion``.
+
+Completion runs on every keypress, so candidates are drawn from the task manifest without
+loading the bakefiles which declare them, and this module imports nothing beyond what is needed
+to answer.
+"""
+
+__all__ = ('complete',)
+
+def complete(self, prefix):
+        node = self.root
+        for character in prefix:
+            node = node.get(character)
+            if node is None:
+                return []
+
+        words, pending = [], [node]
+        while pending:
+            node = pending.pop()
+            for character, value in node.items():
+                if character is None:
+                    words.append(value)
+                else:
+                    pending.append(value)
+        return sorted(words)
+
+def complete(runtime, options, arguments, partial):
+    """Returns the candidates for ``partial``, following the task and parameter ``arguments``
+    of an invocation, once ``runtime`` has loaded its bakefiles."""
+
+    if partial.startswith('-'):
+        candidates = []
+        for option in options:
+            for flag in option.signature.replace(',', ' ').split():
+                if flag.startswith('-') and flag.startswith(partial):
+                    candidates.append(flag)
+        return sorted(candidates)
+
+    if '=' in partial:
+        return []
+
+    from bake.exceptions import TaskError
+    from bake.task import Tasks
+    candidates = set()
+
+    tasks = [argument for argument in arguments if '=' not in argument]
+    if tasks:
+        try:
+            task = runtime._get_task(tasks[-1], deferred=True)
+        except TaskError:
+            task = None
+        if task and task.configuration:
+            for name, parameter in task.configuration.items():
+                if name.startswith(partial) and not getattr(parameter, 'hidden', False):
+                    candidates.add(name + '=')
+
+    alias = None
+    if ':' in partial and runtime.subprojects:
+        namespace = partial.rsplit(':', 1)[0]
+        try:
+            alias = (runtime._load_subproject(namespace), namespace)
+        except TaskError:
+            pass
+
+    names = set()
+    for entries in Tasks.by_source.values():
+        names.update(entries)
+    for target, source, namespace, tasks in runtime.pending.values():
+        names.update(task['name'] for task in tasks)
+
+    prefix = runtime.prefix
+    for name in names:
+        if prefix:
+            if not name.startswith(prefix):
+                continue
+            name = name[len(prefix):]
+        if name.startswith(partial):
+            candidates.add(name)
+        if alias and name.startswith(alias[0] + ':'):
+            name = alias[1] + name[len(alias[0]):]
+            if name.startswith(partial):
+                candidates.add(name)
+
+    for namespace, (bakefile, loaded) in runtime.subprojects.items():
+        if not loaded and namespace.startswith(partial):
+            candidates.add(namespace + ':')
+
+    return sorted(candidates)
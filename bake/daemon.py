@@ -0,0 +1,315 @@
+"""A persistent bake process serving invocations for a project path, along with the thin client
+which forwards invocations to it.
+
+The daemon is started with ``bake --daemon`` and loads bakefiles, modules and environment
+sources once; for each forwarded invocation it forks a child which runs the invocation with the
+stdio of the client, reusing everything already loaded. When any file the daemon loaded changes,
+it declines the invocation, which the client then runs itself, and restarts.
+
+This module is imported by the client on every invocation, so it defers importing the runtime,
+``bake.lib`` and ``subprocess`` until an invocation is run locally. Importing it still imports
+the ``bake`` package, and with it :mod:`bake.task` and its dependencies, which bakefiles expect
+``from bake import *`` to provide.
+"""
+
+import array
+import hashlib
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import sys
+
+__all__ = ('Daemon', 'forward', 'get_socket_path')
+
+RELAYED_SIGNALS = (signal.SIGINT, signal.SIGTERM, signal.SIGHUP)
+
+UNSUPPORTED = ('daemon', 'isolated', 'nobakefile', 'path', 'watch')
+
+def find_socket(path):
+    """Returns the socket of a daemon serving ``path`` or any of its ancestors, disregarding
+    sockets which are not private to the current user."""
+
+    while True:
+        candidate = get_socket_path(path)
+        if (_is_private(os.path.dirname(candidate), stat.S_ISDIR)
+                and _is_private(candidate, stat.S_ISSOCK)):
+            return candidate
+
+        up = os.path.dirname(path)
+        if up == path:
+            return None
+        path = up
+
+def forward(argv=None):
+    """Forwards this invocation to a daemon serving the current path or any of its ancestors,
+    exiting with its exit code, or runs the invocation in this process if there is none."""
+
+    argv = sys.argv if argv is None else argv
+    if hasattr(socket, 'AF_UNIX') and hasattr(socket.socket, 'sendmsg'):
+        if not os.environ.get('BAKE_NODAEMON'):
+            exitcode = _forward(argv)
+            if exitcode is not None:
+                sys.exit(exitcode)
+
+    from bake.runtime import run
+    run()
+
+def get_socket_path(path):
+    directory = os.environ.get('XDG_RUNTIME_DIR') or os.environ.get('TMPDIR') or '/tmp'
+    key = hashlib.sha1(os.path.abspath(path).encode('utf8')).hexdigest()[:16]
+    return os.path.join(directory, 'bake-%d' % os.getuid(), key + '.sock')
+
+def _forward(argv):
+    cwd = os.getcwd()
+    path = find_socket(cwd)
+    if not path:
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+        if _get_peer_uid(connection) not in (None, os.getuid()):
+            connection.close()
+            return None
+
+        request = json.dumps({'argv': argv, 'cwd': cwd, 'environ': dict(os.environ)})
+        connection.sendmsg([request.encode('utf8') + b'\n'],
+            [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', [0, 1, 2]))])
+    except socket.error:
+        connection.close()
+        return None
+
+    child = []
+    def relay(signum, frame):
+        os.kill(child[0], signum)
+
+    handlers = {}
+    reader = connection.makefile('rb')
+    try:
+        for line in reader:
+            response = json.loads(line.decode('utf8'))
+            if 'pid' in response:
+                child.append(response['pid'])
+                for signum in RELAYED_SIGNALS:
+                    handlers[signum] = signal.signal(signum, relay)
+            elif 'exitcode' in response:
+                return response['exitcode']
+            else:
+                return None
+    except (socket.error, ValueError):
+        pass
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+        reader.close()
+        connection.close()
+
+    if child:
+        return 1
+
+def _get_peer_uid(connection):
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+
+    credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+        struct.calcsize('iII'))
+    return struct.unpack('iII', credentials)[1]
+
+def _is_private(path, kind):
+    try:
+        status = os.lstat(path)
+    except OSError:
+        return False
+    return (kind(status.st_mode) and status.st_uid == os.getuid()
+        and not status.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+class Daemon(object):
+    """Serves invocations forwarded by :func:`forward` for the path of ``runtime``, which must
+    have been invoked with ``--daemon`` so that it records what it loads."""
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.path = get_socket_path(runtime.path)
+        self.server = None
+
+    def serve(self):
+        runtime = self.runtime
+        directory = os.path.dirname(self.path)
+        try:
+            os.mkdir(directory, 0o700)
+        except OSError:
+            pass
+        if not _is_private(directory, stat.S_ISDIR):
+            runtime.error('%s is not private to this user; refusing to serve' % directory)
+            return False
+
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except socket.error:
+                os.unlink(self.path)
+            else:
+                runtime.error('a daemon is already serving %s' % runtime.path)
+                return False
+            finally:
+                probe.close()
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077)
+        try:
+            self.server.bind(self.path)
+        finally:
+            os.umask(umask)
+        self.server.listen(64)
+        self.server.settimeout(1.0)
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        runtime.report('serving %s on %s' % (runtime.path, self.path))
+        try:
+            while True:
+                try:
+                    connection = self.server.accept()[0]
+                except socket.timeout:
+                    self._reap()
+                    continue
+
+                try:
+                    stale = self._handle(connection)
+                finally:
+                    connection.close()
+
+                self._reap()
+                if stale:
+                    runtime.info('loaded files have changed; restarting')
+                    self._restart()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._close()
+
+    def _check(self, argv):
+        from bake.runtime import OptionParser
+        try:
+            options = OptionParser().parse_args(argv)[0]
+        except RuntimeError:
+            return None
+
+        for name in UNSUPPORTED:
+            if getattr(options, name, None):
+                return 'unsupported'
+
+        for path, fingerprint in self.runtime.fingerprints.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                current = None
+            else:
+                current = [stat.st_mtime, stat.st_size]
+            if current != fingerprint:
+                return 'stale'
+
+    def _close(self):
+        if self.server:
+            self.server.close()
+            self.server = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def _execute(self, connection, request, fds):
+        exitcode = 1
+        try:
+            self.server.close()
+            for signum in RELAYED_SIGNALS:
+                signal.signal(signum, signal.SIG_DFL)
+
+            for target, fd in zip((0, 1, 2), fds):
+                os.dup2(fd, target)
+                os.close(fd)
+
+            os.chdir(request['cwd'])
+            os.environ.clear()
+            os.environ.update(request['environ'])
+            sys.argv = request['argv']
+
+            from bake.runtime import Runtime
+            runtime = Runtime(os.path.basename(sys.argv[0]))
+            if runtime.invoke(sys.argv[1:]) is False:
+                runtime.error('aborted')
+            else:
+                exitcode = 0
+        except SystemExit as exception:
+            exitcode = exception.code if isinstance(exception.code, int) else 1
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                connection.sendall(json.dumps({'exitcode': exitcode}).encode('utf8') + b'\n')
+            finally:
+                os._exit(exitcode)
+
+    def _handle(self, connection):
+        data, fds = self._receive(connection)
+        if _get_peer_uid(connection) not in (None, os.getuid()):
+            for fd in fds:
+                os.close(fd)
+            return
+
+        if not data:
+            return
+
+        request = json.loads(data.decode('utf8'))
+        reason = self._check(request['argv'][1:])
+        if reason or len(fds) != 3:
+            for fd in fds:
+                os.close(fd)
+            connection.sendall(json.dumps({'declined': reason}).encode('utf8') + b'\n')
+            return (reason == 'stale')
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        pid = os.fork()
+        if not pid:
+            self._execute(connection, request, fds)
+
+        for fd in fds:
+            os.close(fd)
+        connection.sendall(json.dumps({'pid': pid}).encode('utf8') + b'\n')
+
+    def _reap(self):
+        while True:
+            try:
+                pid = os.waitpid(-1, os.WNOHANG)[0]
+            except OSError:
+                return
+            if not pid:
+                return
+
+    def _receive(self, connection):
+        fds = array.array('i')
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk, ancdata, flags, address = connection.recvmsg(65536,
+                socket.CMSG_SPACE(3 * fds.itemsize))
+            if not chunk:
+                break
+
+            data += chunk
+            for level, kind, payload in ancdata:
+                if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                    fds.frombytes(payload[:len(payload) - (len(payload) % fds.itemsize)])
+        return data, list(fds)
+
+    def _restart(self):
+        self._close()
+        script = 'import sys; sys.argv[0] = %r; from bake.runtime import run; run()'
+        os.execv(sys.executable, [sys.executable, '-c', script % sys.argv[0]] + sys.argv[1:])
@@ -0,0 +1,90 @@
+"""Discovery of bakefiles, both in the ancestors of a path and, for monorepos, in the
+subdirectories beneath it.
+
+Each discovery accepts a ``cache`` of what was found in each directory on a previous
+invocation, keyed by directory and recording the directory's mtime; a directory whose mtime
+is unchanged has had no entries added, removed or renamed, so its recorded bakefiles and
+subdirectories are reused and only the directory itself is stat'ed.
+"""
+
+import os
+
+__all__ = ('find_ancestor_bakefiles', 'find_subprojects')
+
+IGNORED_DIRECTORIES = ('.git', '.hg', '.svn', '.tox', '__pycache__', 'node_modules')
+
+def find_ancestor_bakefiles(path, names, cache, nosearch=False):
+    """Returns the bakefiles in ``path`` and each of its ancestors, outermost first, along with
+    an updated cache."""
+
+    candidates, entries = [], {}
+    while True:
+        mtime = get_mtime(path)
+        if mtime is not None:
+            entry = cache.get(path)
+            if not entry or entry[0] != mtime:
+                entry = [mtime, [name for name in names
+                    if os.path.exists(os.path.join(path, name))]]
+            entries[path] = entry
+            candidates[:0] = [os.path.join(path, name) for name in entry[1]]
+
+        if nosearch:
+            break
+
+        up = os.path.dirname(path)
+        if up != path:
+            path = up
+        else:
+            break
+
+    return candidates, entries
+
+def find_subprojects(root, names, cache):
+    """Returns a mapping of each subdirectory of ``root`` containing a bakefile, as a path
+    relative to ``root`` with ``/`` as the separator, to the bakefile which takes precedence
+    within it, along with an updated cache."""
+
+    subprojects, entries = {}, {}
+    pending = ['']
+    while pending:
+        relpath = pending.pop()
+        directory = os.path.join(root, relpath) if relpath else root
+
+        mtime = get_mtime(directory)
+        if mtime is None:
+            continue
+
+        entry = cache.get(relpath)
+        if not entry or entry[0] != mtime:
+            entry = [mtime] + list(scan_directory(directory, names))
+
+        entries[relpath] = entry
+        if relpath and entry[1]:
+            subprojects[relpath] = os.path.join(directory, entry[1][0])
+        for name in entry[2]:
+            pending.append('%s/%s' % (relpath, name) if relpath else name)
+
+    return subprojects, entries
+
+def get_mtime(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return getattr(stat, 'st_mtime_ns', stat.st_mtime)
+
+def scan_directory(directory, names):
+    try:
+        filenames = os.listdir(directory)
+    except OSError:
+        return [], []
+
+    bakefiles = [name for name in names if name in filenames]
+    subdirectories = []
+    for name in sorted(filenames):
+        if name.startswith('.') or name in IGNORED_DIRECTORIES:
+            continue
+        candidate = os.path.join(directory, name)
+        if os.path.isdir(candidate) and not os.path.islink(candidate):
+            subdirectories.append(name)
+    return bakefiles, subdirectories
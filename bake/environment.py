@@ -1,23 +1,41 @@
 import os
 import re
-from pprint import pprint
+from copy import deepcopy
 
-from scheme import Format
+from bake.persistent import PersistentMap, assoc_path, freeze, merge_maps
+from bake.util import bounded_cache, recursive_merge
 
-from bake.util import recursive_merge
-
-__all__ = ('Environment', 'EnvironmentStack')
+__all__ = ('Environment', 'EnvironmentStack', 'PersistentEnvironment')
 
 null = object()
 
+@bounded_cache(4096)
+def compile_path(path):
+    """Compiles the dotted ``path`` to its tokens along with the sequence of token tuples
+    consulted, in order, when finding it: for ``a.b.c``, these are ``a.b.c``, ``a.c`` and
+    ``c``."""
+
+    tokens = tuple(path.split('.'))
+    name = tokens[-1:]
+    return tokens, tuple(tokens[:i] + name for i in range(len(tokens) - 1, -1, -1))
+
 class Environment(object):
-    """A bake runtime environment."""
+    """A bake runtime environment.
+
+    Each environment carries a version which is incremented whenever it is changed through
+    :meth:`set` or :meth:`merge`, along with a generation shared by all environments, so that
+    stacks can cheaply determine whether lookups they have memoized remain valid. Changes made
+    directly to ``environment`` are not tracked.
+    """
+
+    generation = 0
 
     def __init__(self, environment=None, **params):
         if environment and not isinstance(environment, dict):
             raise ValueError(environment)
 
         self.environment = environment or {}
+        self.version = 0
         if params:
             self.environment.update(params)
 
@@ -25,97 +43,67 @@ class Environment(object):
         return 'Environment(%r)' % self.environment
 
     def dump(self):
+        from pprint import pformat
         return pformat(self.environment)
 
     def find(self, path, default=None):
         if '.' not in path:
             return self.environment.get(path, default)
-
-        tokens, name = path.rsplit('.', 1)
-        while True:
-            value = self.get('%s.%s' % (tokens, name), null)
-            if value is not null:
-                return value
-            elif '.' in tokens:
-                tokens = tokens.rsplit('.', 1)[0]
-            else:
-                return self.environment.get(name, default)
+        return self._find(compile_path(path)[1], default)
 
     def get(self, path, default=None):
         if '.' not in path:
             return self.environment.get(path, default)
-
-        tokens = path.split('.')
-        tail = tokens.pop()
-
-        ref = self.environment
-        for token in tokens:
-            if token in ref:
-                ref = ref[token]
-                if not isinstance(ref, dict):
-                    return default
-            else:
-                return default
-        else:
-            return ref.get(tail, default)
+        return self._get(compile_path(path)[0], default)
 
     def has(self, path):
         if '.' not in path:
             return (path in self.environment)
-
-        tokens = path.split('.')
-        tail = tokens.pop()
-
-        ref = self.environment
-        for token in tokens:
-            if token in ref:
-                ref = ref[token]
-                if not isinstance(ref, dict):
-                    return False
-            else:
-                return False
-        else:
-            return (tail in ref)
+        return (self._get(compile_path(path)[0], null) is not null)
 
     def merge(self, source):
         recursive_merge(self.environment, source)
+        self._changed()
         return self
 
     def overlay(self, environment=None, **params):
-        if not isinstance(environment, Environment):
-            environment = Environment(environment)
-        if params:
-            environment.environment.update(params)
+        return EnvironmentStack(self._layer(environment, params), self)
+
+    def parse(self, path, data=None):
+        if data is None:
+            data = self.read(path)
+        if not data:
+            return
 
-        return EnvironmentStack(environment, self)
+        options = data.pop('bake', None)
+        if data:
+            self.merge(data)
 
-    def parse(self, path):
+        return options
+
+    def snapshot(self):
+        return deepcopy(self.environment)
+
+    @staticmethod
+    def read(path):
         if not os.path.exists(path):
             raise RuntimeError('cannot find %r' % path)
 
         try:
-            data = Format.read(path)
-            if not data:
-                return
+            from scheme import Format
+            return Format.read(path)
         except Exception:
             raise RuntimeError('cannot parse %r' % path)
 
-        options = data.pop('bake', None)
-        if data:
-            self.merge(data)
-
-        return options
-
     def set(self, path, value):
         if '.' not in path:
             self.environment[path] = value
+            self._changed()
             return self
 
-        tokens = path.split('.')
-        tail = tokens.pop()
-
+        tokens = compile_path(path)[0]
         ref = self.environment
-        for token in tokens:
+        for token in tokens[:-1]:
             if token not in ref:
                 ref[token] = {}
 
@@ -123,73 +111,198 @@ class Environment(object):
             if not isinstance(ref, dict):
                 raise ValueError(path)
 
-        ref[tail] = value
+        ref[tokens[-1]] = value
+        self._changed()
         return self
 
     def underlay(self, environment=None, **params):
-        if not isinstance(environment, Environment):
+        return EnvironmentStack(self, self._layer(environment, params))
+
+    def write(self, path, format=None, **params):
+        from scheme import Format
+        Format.write(path, self.environment, format, **params)
+        return self
+
+    def _changed(self):
+        self.version += 1
+        Environment.generation += 1
+
+    def _layer(self, environment, params):
+        if environment is None:
+            environment = type(self)()
+        elif not isinstance(environment, Environment):
             environment = Environment(environment)
         if params:
-            environment.environment.update(params)
+            environment._update(params)
+        return environment
 
-        return EnvironmentStack(self, environment)
+    def _find(self, candidates, default=None):
+        for tokens in candidates:
+            value = self._get(tokens, null)
+            if value is not null:
+                return value
+        else:
+            return default
 
-    def write(self, path, format=None, **params):
-        Format.write(path, self.environment, format, **params)
+    def _get(self, tokens, default=None):
+        ref = self.environment
+        for token in tokens:
+            if isinstance(ref, dict) and token in ref:
+                ref = ref[token]
+            else:
+                return default
+        else:
+            return ref
+
+    def _update(self, params):
+        self.environment.update(params)
+        self._changed()
+
+class PersistentEnvironment(Environment):
+    """An environment backed by a :class:`bake.persistent.PersistentMap`.
+
+    Changes through :meth:`set` and :meth:`merge` replace the map rather than changing it in
+    place, sharing all unchanged structure, so a snapshot is the map itself and costs nothing to
+    take. Values retrieved from this environment cannot be changed in place. Overlays and
+    underlays of it are persistent unless they are given a ``dict``, which, as for any
+    environment, becomes the layer itself.
+    """
+
+    def __init__(self, environment=None, **params):
+        if environment and not isinstance(environment, dict):
+            raise ValueError(environment)
+
+        self.environment = freeze(environment or {})
+        self.version = 0
+        if params:
+            self.environment = merge_maps(self.environment, params)
+
+    def __repr__(self):
+        return 'PersistentEnvironment(%r)' % dict(self.environment)
+
+    def merge(self, source):
+        self.environment = merge_maps(self.environment, source)
+        self._changed()
         return self
 
+    def set(self, path, value):
+        self.environment = assoc_path(self.environment, compile_path(path)[0], value)
+        self._changed()
+        return self
+
+    def snapshot(self):
+        return self.environment
+
+    def _update(self, params):
+        environment = dict(self.environment)
+        for key, value in params.items():
+            environment[key] = freeze(value)
+        self.environment = PersistentMap(environment)
+        self._changed()
+
 class EnvironmentStack(object):
+    """A stack of environments, in which each value is resolved by the topmost environment
+    which has it.
+
+    Lookups are memoized until any environment within the stack changes, as determined by the
+    versions of its environments; while no environment at all has changed, the memoized values
+    are used without consulting those versions. A value is only memoized if no environment
+    changed while it was resolved, and only in the memo it was resolved against, so that a
+    lookup racing a change on another thread cannot memoize a stale value.
+    """
+
     def __init__(self, *environments):
         self.stack = list(environments)
+        self.found = {}
+        self.generation = None
+        self.values = {}
+        self.versions = None
 
     def __repr__(self):
         return 'EnvironmentStack(%r)' % self.stack
 
+    @property
+    def version(self):
+        return sum(environment.version for environment in self.stack)
+
     def find(self, path, default=None):
-        for environment in self.stack:
-            value = environment.find(path, null)
-            if value is not null:
-                return value
-        else:
-            return default
+        generation = Environment.generation
+        if self.generation != generation:
+            self._validate(generation)
+
+        found = self.found
+        try:
+            value = found[path]
+        except KeyError:
+            value = self._find(compile_path(path)[1], null)
+            if Environment.generation == generation:
+                found[path] = value
+        return default if value is null else value
 
     def get(self, path, default=None):
-        for environment in self.stack:
-            value = environment.get(path, null)
-            if value is not null:
-                return value
-        else:
-            return default
+        generation = Environment.generation
+        if self.generation != generation:
+            self._validate(generation)
+
+        values = self.values
+        try:
+            value = values[path]
+        except KeyError:
+            value = self._get(compile_path(path)[0], null)
+            if Environment.generation == generation:
+                values[path] = value
+        return default if value is null else value
 
     def has(self, path):
-        for environment in self.stack:
-            if environment.has(path):
-                return True
-        else:
-            return False
+        return (self.get(path, null) is not null)
 
     def merge(self, source):
         self.stack[0].merge(source)
         return self
 
     def overlay(self, environment=None, **params):
-        if not isinstance(environment, Environment):
-            environment = Environment(environment)
-        if params:
-            environment.environment.update(params)
-
-        stack = [environment] + self.stack[:]
+        stack = [self.stack[-1]._layer(environment, params)] + self.stack[:]
         return EnvironmentStack(*stack)
 
     def set(self, path, value):
         self.stack[0].set(path, value)
         return self
 
-    def underlay(self, environment=None, **params):
-        if not isinstance(environment, Environment):
-            environment = Environment(environment)
-        if params:
-            environment.environment.update(params)
+    def snapshot(self):
+        layers = [environment.snapshot() for environment in reversed(self.stack)]
+        if any(isinstance(layer, PersistentMap) for layer in layers):
+            snapshot = PersistentMap()
+            for layer in layers:
+                snapshot = merge_maps(snapshot, layer)
+            return snapshot
+
+        snapshot = {}
+        for layer in layers:
+            recursive_merge(snapshot, layer)
+        return snapshot
 
-        stack = self.stack[:] + [environment]
+    def underlay(self, environment=None, **params):
+        stack = self.stack[:] + [self.stack[-1]._layer(environment, params)]
         return EnvironmentStack(*stack)
+
+    def _find(self, candidates, default=None):
+        for environment in self.stack:
+            value = environment._find(candidates, null)
+            if value is not null:
+                return value
+        else:
+            return default
+
+    def _get(self, tokens, default=None):
+        for environment in self.stack:
+            value = environment._get(tokens, null)
+            if value is not null:
+                return value
+        else:
+            return default
+
+    def _validate(self, generation):
+        versions = [environment.version for environment in self.stack]
+        if versions != self.versions:
+            self.found, self.values, self.versions = {}, {}, versions
+        self.generation = generation
@@ -0,0 +1,83 @@
+"""A persisted description of the tasks and environment declared by each bakefile and module
+loaded by bake, so that help, pattern search and completion can be answered without importing
+them.
+
+An entry is recorded whenever a source is imported and is valid for as long as the files it was
+imported from have not changed; for a bakefile, these include every module first imported while
+importing it, such as helper modules which declare tasks of their own. Only the tasks and the
+environment a source declares are recorded, so other side effects of importing it do not occur
+while its load is deferred.
+"""
+
+import json
+import os
+from collections import namedtuple
+
+__all__ = ('Manifest', 'TaskEntry')
+
+Parameter = namedtuple('Parameter', 'name description required hidden')
+
+def get_fingerprint(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size]
+
+class TaskEntry(object):
+    """A task as recorded in the manifest, providing the attributes of :class:`Task` which are
+    used to describe it."""
+
+    def __init__(self, name, fullname, source, description=None, notes=None, requires=None,
+            parameters=None):
+        self.description = description
+        self.fullname = fullname
+        self.name = name
+        self.notes = notes
+        self.parameters = parameters
+        self.requires = requires
+        self.source = source
+
+    def __repr__(self):
+        return 'TaskEntry(name=%r)' % self.name
+
+    @property
+    def configuration(self):
+        return dict((parameter[0], Parameter(*parameter)) for parameter in self.parameters or ())
+
+    @staticmethod
+    def describe(task, source):
+        parameters = []
+        for name, parameter in sorted((task.configuration or {}).items()):
+            parameters.append([name, parameter.description, bool(parameter.required),
+                bool(getattr(parameter, 'hidden', False))])
+
+        return {'name': task.name, 'fullname': task.fullname, 'source': source,
+            'description': task.description, 'notes': task.notes,
+            'requires': sorted(task.requires or ()), 'parameters': parameters}
+
+class Manifest(object):
+    """The manifest entries for a project, stored within ``state``."""
+
+    def __init__(self, state):
+        self.state = state
+
+    def get(self, key, namespace=None):
+        entry = self.state.get(key)
+        if not entry or entry.get('namespace') != namespace:
+            return None
+
+        for path, fingerprint in entry['files'].items():
+            if get_fingerprint(path) != fingerprint:
+                return None
+        return entry
+
+    def record(self, key, namespace, files, environment, tasks):
+        entry = {'namespace': namespace, 'environment': environment or {}, 'tasks': tasks,
+            'files': dict((path, get_fingerprint(path)) for path in files)}
+
+        try:
+            json.dumps(entry)
+        except (TypeError, ValueError):
+            return
+        self.state.set(key, entry)
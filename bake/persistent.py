@@ -0,0 +1,81 @@
+"""An immutable mapping which shares structure with the mappings it was derived from.
+
+A :class:`PersistentMap` is a ``dict`` which cannot be changed in place, so that it can be read
+everywhere a ``dict`` can. Changes instead produce a new map through :func:`assoc_path` and
+:func:`merge_maps`, which copy only the maps along the paths being changed and share every other
+nested map with the original; deriving a map is proportional to the size of the change and the
+width of the maps along its paths, and never to the size of the whole tree.
+
+Only mappings are shared this way; other mutable values, such as lists, are shared as is.
+"""
+
+__all__ = ('PersistentMap', 'assoc_path', 'freeze', 'merge_maps')
+
+class PersistentMap(dict):
+    """An immutable ``dict``."""
+
+    __slots__ = ()
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (PersistentMap, (dict(self),))
+
+    def __repr__(self):
+        return 'PersistentMap(%s)' % dict.__repr__(self)
+
+    def _immutable(self, *args, **params):
+        raise TypeError('PersistentMap cannot be changed in place')
+
+    __delitem__ = __ior__ = __setitem__ = clear = pop = popitem = setdefault = update = _immutable
+
+def assoc_path(mapping, tokens, value):
+    """Returns a map equal to ``mapping`` but with ``value`` at the path of ``tokens``, creating
+    intermediate maps as necessary. Raises ``ValueError`` if a value along the path is not a
+    mapping."""
+
+    token = tokens[0]
+    if len(tokens) > 1:
+        current = mapping.get(token)
+        if current is None:
+            current = PersistentMap()
+        elif not isinstance(current, dict):
+            raise ValueError('.'.join(tokens))
+        value = assoc_path(current, tokens[1:], value)
+    else:
+        value = freeze(value)
+
+    derived = PersistentMap(mapping)
+    dict.__setitem__(derived, token, value)
+    return derived
+
+def freeze(value):
+    """Returns ``value`` with it and every mapping nested within it converted to a
+    :class:`PersistentMap`."""
+
+    if isinstance(value, PersistentMap) or not isinstance(value, dict):
+        return value
+    return PersistentMap((key, freeze(nested)) for key, nested in value.items())
+
+def merge_maps(original, addition):
+    """Returns the recursive merge of ``addition`` into ``original``, with the semantics of
+    :func:`bake.util.recursive_merge`, as a new map."""
+
+    if not addition:
+        return freeze(original)
+    if not original:
+        return freeze(addition)
+
+    derived = PersistentMap(original)
+    for key, value in addition.items():
+        current = original.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            value = merge_maps(current, value)
+        else:
+            value = freeze(value)
+        dict.__setitem__(derived, key, value)
+    return derived
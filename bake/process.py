@@ -1,34 +1,211 @@
+"""Child processes.
+
+Where ``asyncio`` is available (Python 3.8 and later), child processes are run by an event loop:
+any number of them are supervised by a single thread, and :func:`run_processes` runs many
+concurrently. Otherwise, each child process is supervised by a thread of its own. Where the
+platform supports it, the event loop launches child processes with ``posix_spawnp`` rather than
+``fork`` and ``exec``, which is independent of the size of this process, and waits for them
+through a pidfd; child processes which require a working directory are launched by
+``subprocess`` instead.
+
+The output of a child process is retained until it exits unless a callback is given to receive
+it line by line as it arrives, in which case only a partial line is held in memory for each pipe;
+:meth:`Process.iterate` yields those lines instead. Alternatively, or additionally, output can be
+captured as raw bytes by a :class:`Capture`, which holds a bounded amount of it in memory and
+spills the remainder to disk.
+
+A :class:`Pipeline` connects the standard output of each of a sequence of child processes
+directly to the standard input of the next, so that data passes between them without being
+copied through this process.
+
+A child process run with a timeout is started in a new process group, so that the timeout can
+terminate the entire group rather than only its leader: the group is sent ``SIGTERM`` once the
+timeout expires and ``SIGKILL`` if it has not exited ``Process.grace`` seconds later. Other
+child processes remain in the process group of this process, and so in the foreground of its
+terminal, if it has one, where they can read from the terminal and receive the signals it
+sends, such as ``SIGINT``. No child process is detached from the terminal.
+"""
+
 import os
+import re
 import shlex
+import signal
 import subprocess
 import sys
+from codecs import getincrementaldecoder
+from io import BytesIO
+from locale import getpreferredencoding
 from threading import Thread
-from time import time
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
 
 from bake.util import string
 
+__all__ = ('Capture', 'Pipeline', 'Process', 'ProcessFailedError', 'run_processes')
+
+Finished = object()
+
+Newline = re.compile(r'\r\n|\r|\n')
+
+SIGKILL = getattr(signal, 'SIGKILL', signal.SIGTERM)
+
+RESTORED_SIGNALS = [getattr(signal, name) for name in ('SIGPIPE', 'SIGXFSZ')
+    if hasattr(signal, name)]
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+if asyncio and sys.version_info >= (3, 8):
+    ENGINE = 'asyncio'
+else:
+    ENGINE = 'thread'
+
+SPAWN = (ENGINE == 'asyncio' and hasattr(os, 'posix_spawnp') and hasattr(os, 'pidfd_open')
+    and hasattr(os, 'waitstatus_to_exitcode'))
+
+if os.name != 'posix':
+    GROUP = {}
+elif sys.version_info >= (3, 11):
+    GROUP = {'process_group': 0}
+else:
+    GROUP = {'preexec_fn': lambda: os.setpgid(0, 0)}
+
 class ProcessFailedError(Exception):
-    pass
+    def __str__(self):
+        if len(self.args) != 2 or not isinstance(self.args[1], Process):
+            return Exception.__str__(self)
+
+        returncode, process = self.args
+        output = process.stdout if process.merge_output else process.stderr
+        if not isinstance(output, Capture):
+            return Exception.__str__(self)
+
+        return 'process exited with return code %s; last output:\n%s' % (returncode,
+            output.decode(tail=True))
+
+class Capture(object):
+    """The raw output written by a child process to one of its pipes.
+
+    Output is held in memory up to ``threshold`` bytes, beyond which it is spilled to a
+    temporary file; the last ``tail`` bytes are also retained in memory, for error reporting.
+    """
+
+    tail_size = 65536
+    threshold = 1048576
+
+    def __init__(self, threshold=None, tail=None):
+        self.buffer = bytearray()
+        self.file = BytesIO()
+        self.mapping = None
+        self.size = 0
+        self.spilled = False
+        self.tail_size = tail or self.tail_size
+        self.threshold = threshold or self.threshold
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return 'Capture(size=%d)' % self.size
+
+    @property
+    def tail(self):
+        """The last ``tail`` bytes of output."""
+        return bytes(self.buffer[-self.tail_size:])
+
+    def close(self):
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+        self.file.close()
+
+    def decode(self, tail=False):
+        """Returns the output, or only its tail, decoded as text; as the tail can begin partway
+        through a character, undecodable bytes in it are replaced rather than raising an error."""
+
+        if tail:
+            return _decode(self.tail, 'replace')
+        return _decode(self.getvalue())
+
+    def getbuffer(self):
+        """Returns a read-only ``memoryview`` of the output, which maps the temporary file if the
+        output has been spilled to disk."""
+
+        if not self.spilled:
+            return memoryview(self.file.getvalue())
+        if not self.size:
+            return memoryview(b'')
+
+        if self.mapping is None:
+            import mmap
+            self.file.flush()
+            self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self.mapping)
+
+    def getvalue(self):
+        return self.open().read()
+
+    def open(self):
+        """Returns the file containing the output, positioned at its start."""
+        self.file.seek(0)
+        return self.file
+
+    def write(self, data):
+        if not self.spilled and self.size + len(data) > self.threshold:
+            self._spill()
+
+        self.file.seek(0, 2)
+        self.file.write(data)
+        self.size += len(data)
+
+        buffer = self.buffer
+        buffer.extend(data[-self.tail_size:])
+        if len(buffer) > 2 * self.tail_size:
+            del buffer[:-self.tail_size]
+
+    def _spill(self):
+        from tempfile import TemporaryFile
+        spilled = TemporaryFile()
+        spilled.write(self.file.getvalue())
+        self.file, self.spilled = spilled, True
 
 class Process(object):
     """A child process of the current process.
 
+    If ``on_line`` is specified, it is called with each line of output, without its line
+    terminator, and the name of the stream it was written to, either ``'stdout'`` or
+    ``'stderr'``; the output is then not retained in ``stdout`` and ``stderr``.
+
+    If ``capture`` is true, ``stdout`` and ``stderr`` are instead each a :class:`Capture`,
+    whether or not ``on_line`` is specified; ``capture`` can also be a callable returning one.
     """
 
+    grace = 5.0
+
     def __init__(self, cmdline, environ=None, shell=False, merge_output=False,
-            passthrough=False):
+            passthrough=False, on_line=None, capture=False):
 
         if isinstance(cmdline, string) and not shell:
             cmdline = shlex.split(cmdline)
 
+        self.capture = capture
         self.cmdline = cmdline
+        self.grouped = False
         self.merge_output = merge_output
+        self.on_line = on_line
         self.passthrough = passthrough
+        self.pid = None
         self.process = None
         self.returncode = None
         self.shell = shell
         self.stderr = None
         self.stdout = None
+        self.timedout = False
 
         self.environ = dict(os.environ)
         if environ:
@@ -40,35 +217,663 @@ class Process(object):
         if report:
             report('shell: %s' % ' '.join(self.cmdline))
 
+        if ENGINE == 'asyncio':
+            run_processes([self], data=data, timeout=timeout, cwd=cwd, check=False)
+        else:
+            self._run_in_thread(data, timeout, cwd)
+        return self.returncode
+
+    def iterate(self, data=None, timeout=None, report=None, cwd=None, maxsize=1024):
+        """Runs this child process, yielding each line of its standard output as it arrives.
+        Lines written to standard error are passed to ``on_line``, if specified, unless
+        ``merge_output`` is set; ``on_line`` is called by the consuming thread. At most
+        ``maxsize`` lines are held for the consumer; beyond that, the child process blocks until
+        they are consumed. Abandoning the iteration kills the child process."""
+
+        if report:
+            report('shell: %s' % ' '.join(self.cmdline))
+
+        queue = Queue(maxsize)
+        on_line = self.on_line
+        failures = []
+
+        def deliver(line, stream):
+            queue.put((line, stream))
+
         def _thread():
-            stdout = subprocess.PIPE
-            if self.passthrough:
-                stdout = sys.stdout
+            try:
+                self(data, timeout, cwd=cwd)
+            except BaseException as exception:
+                failures.append(exception)
+            finally:
+                queue.put(Finished)
+
+        self.on_line = deliver
+        thread = Thread(target=_thread)
+        thread.daemon = True
+        thread.start()
+
+        try:
+            while True:
+                item = queue.get()
+                if item is Finished:
+                    break
+                elif item[1] == 'stdout':
+                    yield item[0]
+                elif on_line:
+                    on_line(*item)
+        finally:
+            self.on_line = on_line
+            if thread.is_alive():
+                self._signal(SIGKILL)
+                while queue.get() is not Finished:
+                    pass
+            thread.join()
+
+        if failures:
+            raise failures[0]
+
+    def run(self, data=None, timeout=None, report=None, cwd=None):
+        returncode = self(data, timeout, report, cwd)
+        if returncode != 0:
+            raise ProcessFailedError(returncode, self)
+
+    def _close_outputs(self, outputs):
+        if 1 in outputs:
+            self.stdout = outputs[1].close()
+        if 2 in outputs:
+            self.stderr = outputs[2].close()
+
+        for fd, output in sorted(outputs.items()):
+            if output.exception is not None:
+                return output.exception
+
+    def _get_outputs(self):
+        capture = self.capture
+        if capture is True:
+            capture = Capture
 
-            stderr = subprocess.PIPE
-            if self.merge_output:
-                stderr = subprocess.STDOUT
-            elif self.passthrough:
-                stderr = sys.stderr
+        stdout, stderr = self._get_streams()
+        outputs = {}
+        if stdout == subprocess.PIPE:
+            outputs[1] = _Output('stdout', self.on_line, capture() if capture else None)
+        if stderr == subprocess.PIPE:
+            outputs[2] = _Output('stderr', self.on_line, capture() if capture else None)
+        return outputs
 
-            self.process = subprocess.Popen(self.cmdline, bufsize=0, env=self.environ,
-                shell=self.shell, cwd=cwd, stdin=subprocess.PIPE, stdout=stdout,
-                stderr=stderr, universal_newlines=True)
+    def _get_group(self, timeout):
+        self.grouped = timeout is not None and bool(GROUP)
+        if self.grouped:
+            return GROUP
+        return {}
 
-            self.stdout, self.stderr = self.process.communicate(data)
+    def _get_streams(self):
+        stdout = subprocess.PIPE
+        if self.passthrough:
+            stdout = sys.stdout
+
+        stderr = subprocess.PIPE
+        if self.merge_output:
+            stderr = subprocess.STDOUT
+        elif self.passthrough:
+            stderr = sys.stderr
+        return stdout, stderr
+
+    def _run_in_thread(self, data, timeout, cwd):
+        stdout, stderr = self._get_streams()
+        self.process = subprocess.Popen(self.cmdline, bufsize=0, env=self.environ,
+            shell=self.shell, cwd=cwd, stdin=subprocess.PIPE, stdout=stdout,
+            stderr=stderr, **self._get_group(timeout))
+        self.pid = self.process.pid
+        outputs = self._get_outputs()
+
+        def _thread():
+            pumps = [Thread(target=_write_input, args=(self.process.stdin, data))]
+            for fd, pipe in ((1, self.process.stdout), (2, self.process.stderr)):
+                if fd in outputs:
+                    pumps.append(Thread(target=_pump, args=(pipe, outputs[fd])))
+
+            for pump in pumps:
+                pump.daemon = True
+                pump.start()
+            for pump in pumps:
+                pump.join()
+            self.process.wait()
 
         thread = Thread(target=_thread)
+        thread.daemon = True
         thread.start()
 
         thread.join(timeout)
-        if thread.isAlive():
-            self.process.terminate()
+        if thread.is_alive():
+            self.timedout = True
+            self._signal(signal.SIGTERM)
+            thread.join(self.grace)
+            if thread.is_alive():
+                self._signal(SIGKILL)
             thread.join()
 
         self.returncode = self.process.returncode
+        exception = self._close_outputs(outputs)
+        if exception is not None:
+            raise exception
+
+    def _signal(self, signum):
+        if self.returncode is not None or self.pid is None:
+            return
+        try:
+            if self.grouped:
+                os.killpg(self.pid, signum)
+            else:
+                os.kill(self.pid, signum)
+        except OSError:
+            pass
+
+class Pipeline(object):
+    """A sequence of child processes, the standard output of each of which is connected to the
+    standard input of the next, as by ``a | b | c`` in a shell.
+
+    The standard input of the first process is ``stdin``, if specified, as a file or file
+    descriptor, and otherwise receives ``data``; the standard output of the last process is
+    ``stdout``, if specified, and is otherwise retained in ``stdout``, as bytes if ``binary``
+    is true, or as a :class:`Capture` if ``capture`` is true. The standard error of each process
+    is retained by the corresponding :class:`Process` in ``processes``, unless ``passthrough``
+    is true.
+
+    ``returncodes`` lists the return code of each process; ``returncode`` is that of the last
+    process to fail, or zero, as with ``set -o pipefail``.
+    """
+
+    grace = Process.grace
+
+    def __init__(self, cmdlines, environ=None, binary=False, capture=False, passthrough=False,
+            stdin=None, stdout=None):
+
+        self.binary = binary
+        self.capture = capture
+        self.processes = [Process(cmdline, environ, passthrough=passthrough)
+            for cmdline in cmdlines]
+        self.stdin = stdin
+        self.stdout = None
+        self.target = stdout
+        self.timedout = False
+
+        if not self.processes:
+            raise ValueError('a pipeline requires at least one command')
+
+    def __call__(self, data=None, timeout=None, report=None, cwd=None):
+        """Runs this pipeline."""
+
+        if report:
+            report('pipeline: %s' % ' | '.join(' '.join(process.cmdline)
+                for process in self.processes))
+
+        for process in self.processes:
+            process.returncode = None
+
+        capture = self.capture
+        if capture is True:
+            capture = Capture
+
+        output = None
+        if self.target is None:
+            output = _Output('stdout', capture=capture() if capture else None,
+                binary=self.binary)
+
+        pumps, outputs = self._start(data, output, cwd, timeout)
+
+        def _thread():
+            for pump in pumps:
+                pump.join()
+            for process in self.processes:
+                process.returncode = process.process.wait()
+
+        thread = Thread(target=_thread)
+        thread.daemon = True
+        thread.start()
+
+        thread.join(timeout)
+        if thread.is_alive():
+            self.timedout = True
+            self._signal(signal.SIGTERM)
+            thread.join(self.grace)
+            if thread.is_alive():
+                self._signal(SIGKILL)
+            thread.join()
+
+        exceptions = [process._close_outputs(outputs[i])
+            for i, process in enumerate(self.processes)]
+        if output is not None:
+            self.stdout = self.processes[-1].stdout = output.close()
+        for exception in exceptions:
+            if exception is not None:
+                raise exception
         return self.returncode
 
+    @property
+    def returncode(self):
+        returncode = 0
+        for process in self.processes:
+            if process.returncode is None:
+                return None
+            elif process.returncode != 0:
+                returncode = process.returncode
+        return returncode
+
+    @property
+    def returncodes(self):
+        return [process.returncode for process in self.processes]
+
     def run(self, data=None, timeout=None, report=None, cwd=None):
         returncode = self(data, timeout, report, cwd)
         if returncode != 0:
             raise ProcessFailedError(returncode, self)
+
+    def _signal(self, signum):
+        for process in self.processes:
+            process._signal(signum)
+
+    def _start(self, data, output, cwd=None, timeout=None):
+        processes = self.processes
+        closing = []
+        outputs = []
+        pumps = []
+
+        stdin = self.stdin
+        if stdin is None:
+            stdin = subprocess.PIPE
+
+        try:
+            for i, process in enumerate(processes):
+                if i == len(processes) - 1:
+                    stdout = self.target
+                    if stdout is None:
+                        stdout = subprocess.PIPE
+                else:
+                    descriptor, stdout = os.pipe()
+                    closing.extend((descriptor, stdout))
+
+                stderr = subprocess.PIPE
+                if process.passthrough:
+                    stderr = sys.stderr
+
+                process.process = subprocess.Popen(process.cmdline, bufsize=0,
+                    env=process.environ, cwd=cwd, stdin=stdin, stdout=stdout, stderr=stderr,
+                    close_fds=os.name == 'posix', **process._get_group(timeout))
+                process.pid = process.process.pid
+
+                outputs.append({})
+                if not process.passthrough:
+                    outputs[i][2] = _Output('stderr')
+                    pumps.append(Thread(target=_pump, args=(process.process.stderr,
+                        outputs[i][2])))
+
+                if i > 0:
+                    os.close(stdin)
+                    closing.remove(stdin)
+                if i < len(processes) - 1:
+                    os.close(stdout)
+                    closing.remove(stdout)
+                    stdin = descriptor
+        except BaseException:
+            for descriptor in closing:
+                os.close(descriptor)
+            self._signal(SIGKILL)
+            for process in processes[:len(outputs)]:
+                process.process.wait()
+                process.returncode = process.process.returncode
+                for pipe in (process.process.stdin, process.process.stdout,
+                        process.process.stderr):
+                    if pipe is not None:
+                        pipe.close()
+            raise
+
+        first, last = processes[0].process, processes[-1].process
+        if first.stdin is not None:
+            pumps.append(Thread(target=_write_input, args=(first.stdin, data)))
+        if output is not None:
+            pumps.append(Thread(target=_pump, args=(last.stdout, output)))
+
+        for pump in pumps:
+            pump.daemon = True
+            pump.start()
+        return pumps, outputs
+
+def run_processes(processes, concurrency=None, data=None, timeout=None, cwd=None, check=True):
+    """Runs ``processes``, at most ``concurrency`` at a time, and waits for all of them to exit.
+    ``timeout`` applies to each process individually. Raises :exc:`ProcessFailedError` for the
+    first process, in the order given, which exited with a non-zero return code if ``check`` is
+    true."""
+
+    processes = list(processes)
+    if ENGINE == 'asyncio':
+        _run_in_loop(processes, concurrency or len(processes) or 1, data, timeout, cwd)
+    else:
+        for process in processes:
+            process(data, timeout, cwd=cwd)
+
+    if check:
+        for process in processes:
+            if process.returncode != 0:
+                raise ProcessFailedError(process.returncode, process)
+    return processes
+
+def _decode(data, errors='strict'):
+    if data is None:
+        return None
+
+    text = data.decode(getpreferredencoding(False), errors)
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+def _encode(data):
+    if data is None or isinstance(data, bytes):
+        return data
+    return data.encode(getpreferredencoding(False))
+
+def _pump(pipe, output):
+    try:
+        while True:
+            data = os.read(pipe.fileno(), 65536)
+            if not data:
+                break
+            output.write(data)
+    finally:
+        pipe.close()
+
+def _run_in_loop(processes, concurrency, data, timeout, cwd):
+    loop = asyncio.new_event_loop()
+    finished = loop.create_future()
+    pending = list(reversed(processes))
+    running = set()
+    errors = []
+
+    data = _encode(data)
+
+    def complete(process, exception=None):
+        if exception is not None:
+            errors.append(exception)
+
+        running.discard(process)
+        if not finished.done():
+            if pending and not errors:
+                launch(pending.pop())
+            elif not running:
+                finished.set_result(None)
+
+    def launch(process):
+        running.add(process)
+        if SPAWN and cwd is None:
+            try:
+                _SpawnedProcess(loop, process, complete, data, timeout).start()
+            except Exception as exception:
+                complete(process, exception)
+            return
+
+        stdout, stderr = process._get_streams()
+        protocol = _SubprocessProtocol(loop, process, complete, data, timeout)
+        if process.shell and isinstance(process.cmdline, string):
+            starting = loop.subprocess_shell(lambda: protocol, process.cmdline,
+                env=process.environ, cwd=cwd, stdin=subprocess.PIPE, stdout=stdout,
+                stderr=stderr, **process._get_group(timeout))
+        else:
+            cmdline = process.cmdline
+            if process.shell:
+                cmdline = ['/bin/sh', '-c'] + list(cmdline)
+            starting = loop.subprocess_exec(lambda: protocol, *cmdline,
+                env=process.environ, cwd=cwd, stdin=subprocess.PIPE, stdout=stdout,
+                stderr=stderr, **process._get_group(timeout))
+
+        def started(future):
+            exception = future.exception()
+            if exception is not None:
+                complete(process, exception)
+
+        loop.create_task(starting).add_done_callback(started)
+
+    try:
+        for i in range(min(concurrency, len(pending))):
+            launch(pending.pop())
+        if running:
+            loop.run_until_complete(finished)
+    except BaseException:
+        for process in list(running):
+            process._signal(SIGKILL)
+        raise
+    finally:
+        loop.close()
+
+    if errors:
+        raise errors[0]
+
+def _write_input(pipe, data):
+    try:
+        if data:
+            pipe.write(_encode(data))
+    except (IOError, OSError):
+        pass
+    finally:
+        try:
+            pipe.close()
+        except (IOError, OSError):
+            pass
+
+class _Output(object):
+    """The output written by a child process to one of its pipes, which is written to
+    ``capture``, if specified, and decoded and delivered to ``on_line`` a line at a time, if
+    specified, or otherwise retained. Partial lines are held until they are completed, up to
+    ``limit`` characters."""
+
+    limit = 65536
+
+    def __init__(self, stream, on_line=None, capture=None, binary=False):
+        self.binary = binary
+        self.capture = capture
+        self.chunks = None
+        self.exception = None
+        self.on_line = on_line
+        self.partial = ''
+        self.stream = stream
+
+        if on_line:
+            self.decoder = getincrementaldecoder(getpreferredencoding(False))('replace')
+        elif capture is None:
+            self.chunks = []
+
+    def close(self):
+        if self.on_line:
+            if self.exception is None:
+                self._deliver(self.partial + self.decoder.decode(b'', True), True)
+            self.partial = ''
+
+        if self.capture is not None:
+            return self.capture
+        elif self.chunks is not None:
+            data = b''.join(self.chunks)
+            return data if self.binary else _decode(data)
+
+    def write(self, data):
+        if self.capture is not None:
+            self.capture.write(data)
+        elif self.chunks is not None:
+            self.chunks.append(data)
+
+        if self.on_line and self.exception is None:
+            self._deliver(self.partial + self.decoder.decode(data), False)
+
+    def _deliver(self, text, final):
+        try:
+            self._split(text, final)
+        except Exception as exception:
+            self.exception = exception
+
+    def _split(self, text, final):
+        held = ''
+        if not final and text.endswith('\r'):
+            text, held = text[:-1], '\r'
+
+        lines = Newline.split(text)
+        partial = lines.pop()
+        for line in lines:
+            self.on_line(line, self.stream)
+
+        if final:
+            if partial:
+                self.on_line(partial, self.stream)
+            return
+
+        while len(partial) > self.limit:
+            self.on_line(partial[:self.limit], self.stream)
+            partial = partial[self.limit:]
+        self.partial = partial + held
+
+if asyncio:
+    class _SubprocessProtocol(asyncio.SubprocessProtocol):
+        def __init__(self, loop, process, callback, data=None, timeout=None):
+            self.callback = callback
+            self.data = data
+            self.loop = loop
+            self.outputs = process._get_outputs()
+            self.process = process
+            self.timeout = timeout
+            self.timer = None
+            self.transport = None
+
+        def connection_made(self, transport):
+            self.transport = transport
+            self.process.pid = transport.get_pid()
+            if self.timeout is not None:
+                self.timer = self.loop.call_later(self.timeout, self.terminate)
+
+            stdin = transport.get_pipe_transport(0)
+            if self.data:
+                stdin.write(self.data)
+            stdin.close()
+
+        def connection_lost(self, exception):
+            if self.timer:
+                self.timer.cancel()
+
+            process = self.process
+            process.returncode = self.transport.get_returncode()
+            self.transport.close()
+
+            self.callback(process, process._close_outputs(self.outputs))
+
+        def pipe_data_received(self, fd, data):
+            self.outputs[fd].write(data)
+
+        def terminate(self):
+            self.process.timedout = True
+            self.process._signal(signal.SIGTERM)
+            self.timer = self.loop.call_later(self.process.grace, self.process._signal, SIGKILL)
+
+    class _PipeReader(asyncio.Protocol):
+        def __init__(self, spawned, fd):
+            self.fd = fd
+            self.spawned = spawned
+
+        def connection_lost(self, exception):
+            self.spawned.finish()
+
+        def data_received(self, data):
+            self.spawned.outputs[self.fd].write(data)
+
+    class _SpawnedProcess(object):
+        """A child process launched by ``posix_spawnp``, whose pipes are read by ``loop`` and
+        whose exit is signalled through a pidfd."""
+
+        def __init__(self, loop, process, callback, data=None, timeout=None):
+            self.callback = callback
+            self.data = data
+            self.loop = loop
+            self.outputs = process._get_outputs()
+            self.pending = 1 + len(self.outputs)
+            self.pidfd = None
+            self.process = process
+            self.returncode = None
+            self.timeout = timeout
+            self.timer = None
+
+        def finish(self):
+            self.pending -= 1
+            if self.pending:
+                return
+
+            if self.timer:
+                self.timer.cancel()
+
+            process = self.process
+            process.returncode = self.returncode
+            self.callback(process, process._close_outputs(self.outputs))
+
+        def start(self):
+            process, loop = self.process, self.loop
+            cmdline = process.cmdline
+            if process.shell:
+                if isinstance(cmdline, string):
+                    cmdline = [cmdline]
+                cmdline = ['/bin/sh', '-c'] + list(cmdline)
+
+            stdout, stderr = process._get_streams()
+            descriptor, stdin = os.pipe()
+            actions, closing, readers = [(os.POSIX_SPAWN_DUP2, descriptor, 0)], [descriptor], {}
+            try:
+                for fd, target in ((1, stdout), (2, stderr)):
+                    if target == subprocess.PIPE:
+                        readers[fd], descriptor = os.pipe()
+                        closing.append(descriptor)
+                        actions.append((os.POSIX_SPAWN_DUP2, descriptor, fd))
+                    elif target == subprocess.STDOUT:
+                        actions.append((os.POSIX_SPAWN_DUP2, 1, fd))
+                    else:
+                        actions.append((os.POSIX_SPAWN_DUP2, target.fileno(), fd))
+
+                group = {}
+                process.grouped = self.timeout is not None
+                if process.grouped:
+                    group['setpgroup'] = 0
+                process.pid = os.posix_spawnp(cmdline[0], cmdline, process.environ,
+                    file_actions=actions, setsigdef=RESTORED_SIGNALS, **group)
+            except BaseException:
+                os.close(stdin)
+                for descriptor in readers.values():
+                    os.close(descriptor)
+                raise
+            finally:
+                for descriptor in closing:
+                    os.close(descriptor)
+
+            self.pidfd = os.pidfd_open(process.pid)
+            loop.add_reader(self.pidfd, self._exited)
+            if self.timeout is not None:
+                self.timer = loop.call_later(self.timeout, self._terminate)
+
+            for fd, descriptor in readers.items():
+                pipe = os.fdopen(descriptor, 'rb', 0)
+                loop.create_task(loop.connect_read_pipe(
+                    lambda fd=fd: _PipeReader(self, fd), pipe))
+
+            if self.data:
+                pipe = os.fdopen(stdin, 'wb', 0)
+                loop.create_task(loop.connect_write_pipe(asyncio.Protocol,
+                    pipe)).add_done_callback(self._write_input)
+            else:
+                os.close(stdin)
+
+        def _exited(self):
+            self.loop.remove_reader(self.pidfd)
+            os.close(self.pidfd)
+            status = os.waitpid(self.process.pid, 0)[1]
+            self.returncode = os.waitstatus_to_exitcode(status)
+            self.finish()
+
+        def _terminate(self):
+            self.process.timedout = True
+            self.process._signal(signal.SIGTERM)
+            self.timer = self.loop.call_later(self.process.grace, self.process._signal, SIGKILL)
+
+        def _write_input(self, future):
+            if future.exception() is None:
+                transport = future.result()[0]
+                transport.write(self.data)
+                transport.close()
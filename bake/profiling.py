@@ -0,0 +1,103 @@
+"""Profiling of the execution of tasks with ``cProfile``.
+
+Only the ``run`` phase of each task is profiled. Statistics are aggregated by task fullname, so
+that every instance of a task class executed within a run is combined into a single ``.pstats``
+file, which can be examined with ``python -m pstats`` or tools such as snakeviz.
+
+A profiler observes only the thread which enabled it, and from Python 3.12 only one can be active
+at a time, in which case it observes every thread; tasks are therefore executed serially while
+profiling, whatever the number of jobs. A task executed by another task while it is profiled is
+included in the statistics of the latter.
+"""
+
+import os
+from threading import Lock
+
+import cProfile
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import pstats
+
+__all__ = ('Profiler',)
+
+class Profiler(object):
+    """Profiles tasks, aggregating statistics by task fullname for writing to ``directory``;
+    when ``merge`` is true, statistics from previous invocations are merged into each file."""
+
+    def __init__(self, directory=None, merge=False, limit=10):
+        self.active = False
+        self.directory = directory
+        self.limit = limit
+        self.lock = Lock()
+        self.merge = merge
+        self.stats = {}
+
+    def add(self, fullname, profile):
+        """Adds the statistics collected by ``profile``, a profiler, to those for the task
+        ``fullname``."""
+
+        with self.lock:
+            stats = self.stats.get(fullname)
+            if stats is None:
+                self.stats[fullname] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+
+    def get_path(self, fullname):
+        return os.path.join(self.directory, fullname.replace('/', '.') + '.pstats')
+
+    def profile(self, fullname, function, *args, **params):
+        """Calls ``function`` under a profiler, adding the statistics to those for the task
+        ``fullname``."""
+
+        if self.active:
+            return function(*args, **params)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        self.active = True
+        try:
+            return function(*args, **params)
+        finally:
+            profiler.disable()
+            self.active = False
+            self.add(fullname, profiler)
+
+    def summarize(self, fullname):
+        """Returns the ``limit`` functions with the greatest cumulative time for the task
+        ``fullname``, as text."""
+
+        stream = StringIO()
+        stats = self.stats[fullname]
+        original, stats.stream = stats.stream, stream
+        try:
+            stats.sort_stats('cumulative').print_stats(self.limit)
+        finally:
+            stats.stream = original
+        return stream.getvalue().strip('\n')
+
+    def write(self, report=None):
+        """Writes the statistics for each task to its ``.pstats`` file, returning the paths;
+        ``report``, if specified, is called with a message for each previous file which cannot
+        be merged, and is then overwritten."""
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+        paths = []
+        for fullname, stats in sorted(self.stats.items()):
+            path = self.get_path(fullname)
+            if self.merge and os.path.exists(path):
+                try:
+                    stats = self.stats[fullname] = pstats.Stats(path).add(stats)
+                except Exception as exception:
+                    if report:
+                        report('cannot merge profile statistics from %r: %s' % (path,
+                            exception))
+            stats.dump_stats(path)
+            paths.append(path)
+        return paths
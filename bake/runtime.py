@@ -4,34 +4,25 @@ import shlex
 import sys
 import textwrap
 from collections import defaultdict, namedtuple
+from copy import deepcopy
 from datetime import datetime
 from operator import attrgetter
-from tempfile import mkstemp
 from textwrap import dedent
-from traceback import format_exc
+from threading import RLock, local
 
 try:
     raw_input
 except NameError:
     raw_input = input
 
-try:
-    from ConfigParser import SafeConfigParser
-except ImportError:
-    from configparser import SafeConfigParser
-
-try:
-    from urllib import urlretrieve
-except ImportError:
-    from urllib.request import urlretrieve
-
 from bake.appdirs import user_config_dir
+from bake.cache import ResultCache, State, get_cache_path, get_project_key
 from bake.color import ansify
 from bake.environment import *
 from bake.exceptions import *
-from bake.path import path
-from bake.process import Process
+from bake.manifest import Manifest, TaskEntry
 from bake.task import Tasks, Task
+from bake.trace import NullSpan
 from bake.util import *
 
 BAKECONFIG = 'bake.yaml'
@@ -48,32 +39,46 @@ Option = namedtuple('Option', 'signature name type description')
 class OptionParser(optparse.OptionParser):
     Options = (
         Option('-c, --color', 'color', 'flag', 'use color in output'),
+        Option('    --daemon', 'daemon', 'flag',
+            'serve invocations for this path from a persistent process'),
         Option('-d, --dryrun', 'dryrun', 'flag', 'run tasks in dry-run mode'),
         Option('-D, --debug', 'debug', 'flag', 'run tasks in debug mode'),
         Option('-e, --env FILE', 'sources', 'list',
             'populate runtime environment from specified file'),
         Option('-f, --find PATTERN', 'pattern', 'list',
             'find and describe tasks matching pattern'),
+        Option('-F, --force', 'force', 'flag', 'execute tasks even when up to date'),
         Option('-h, --help [TASK]', 'help', 'flag', 'display help [on specified task]'),
         Option('-i, --interactive', 'interactive', 'flag', 'run tasks in interactive mode'),
         Option('    --isolated', 'isolated', 'flag',
             'run isolated (no env variables, no bakefiles)'),
+        Option('-j, --jobs N', 'jobs', 'value', 'run up to N tasks concurrently'),
         Option('-l, --logfile FILE', 'logfiles', 'list', 'log messages to specified file'),
         Option('-m, --module MODULE', 'modules', 'list', 'load tasks from specified module'),
+        Option('-M, --monorepo', 'monorepo', 'flag',
+            'load bakefiles in subdirectories as namespaced sub-projects'),
         Option('    --nocolor', 'nocolor', 'flag', 'force no color in output'),
         Option('-n, --nosearch', 'nosearch', 'flag',
             'do not search parent directories for bakefiles'),
         Option('-N, --nobakefile', 'nobakefile', 'flag', 'do not load bakefiles'),
         Option('-p, --path PATH', 'path', 'value', 'run tasks under specified path'),
         Option('    --prefix PREFIX', 'prefix', 'value', 'apply specified prefix to task names'),
+        Option('    --profile', 'profile', 'flag',
+            'profile each task, serially, and display the most expensive functions'),
+        Option('    --profiledir DIR', 'profiledir', 'value',
+            'write profile statistics for each task to DIR'),
+        Option('    --profilemerge', 'profilemerge', 'flag',
+            'merge profile statistics with those from previous runs'),
         Option('-P, --pythonpath PATH', 'pythonpath', 'list', 'add specified path to python path'),
         Option('-q, --quiet', 'quiet', 'flag', 'only log error messages'),
         Option('-s, --set PARAM=VALUE', 'params', 'list',
             'sets the specified parameter in the runtime environment'),
         Option('-t, --timestamps', 'timestamps', 'flag', 'include timestamps in all messages'),
         Option('-T, --timing', 'timing', 'flag', 'calculate and display timing for each task'),
+        Option('    --trace FILE', 'trace', 'value', 'write a chrome trace of the run to FILE'),
         Option('-v, --verbose', 'verbose', 'flag', 'log all messages'),
-        Option('-V, --version', 'version', 'flag', 'display version information')
+        Option('-V, --version', 'version', 'flag', 'display version information'),
+        Option('-w, --watch', 'watch', 'flag', 're-run tasks when files under path change'),
     )
 
     def __init__(self):
@@ -110,14 +115,19 @@ class OptionParser(optparse.OptionParser):
     def error(self, msg):
         raise RuntimeError(msg)
 
-    def generate_help(self, runtime):
+    def generate_help(self, runtime, patterns=None):
         sections = [USAGE % (runtime.executable, '{task}'), DESCRIPTION.strip()]
+        catalog = runtime.catalog
+        if patterns:
+            catalog = dict((source, dict((name, task) for name, task in tasks.items()
+                if self._match_task(task, patterns))) for source, tasks in catalog.items())
 
         length = 0
         for option in self.Options:
             length = max(length, len(option.signature))
-        for name in Tasks.by_name.keys():
-            length = max(length, len(name))
+        for tasks in catalog.values():
+            for name in tasks:
+                length = max(length, len(name))
 
         template = '  %%-%ds    %%s' % length
         indent = ' ' * (length + 6)
@@ -127,13 +137,23 @@ class OptionParser(optparse.OptionParser):
             options.append(template % (option.signature, option.description))
 
         sections.append('Options:\n%s' % '\n'.join(options))
-        for source, tasks in sorted(Tasks.by_source.items()):
+        for source, tasks in sorted(catalog.items()):
+            if not tasks:
+                continue
+
             entries = []
             for name, task in sorted(tasks.items()):
                 description = self._format_text(task.description, indent)
                 entries.append(template % (name, description))
             sections.append('Tasks from %s:\n%s' % (source, '\n'.join(entries)))
 
+        subprojects = sorted(namespace for namespace, (bakefile, loaded)
+            in runtime.subprojects.items() if not loaded)
+        if subprojects:
+            entries = ['  %s' % namespace for namespace in subprojects]
+            sections.append('Sub-projects (run tasks as {project}:{task}):\n%s'
+                % '\n'.join(entries))
+
         return '\n\n'.join(sections)
 
     def generate_task_help(self, runtime, task):
@@ -180,6 +200,16 @@ class OptionParser(optparse.OptionParser):
 
         return original
 
+    def _match_task(self, task, patterns):
+        from fnmatch import fnmatch
+        for pattern in patterns:
+            if fnmatch(task.name, pattern):
+                return True
+            pattern = pattern.lower()
+            if pattern in task.name.lower() or pattern in (task.description or '').lower():
+                return True
+        return False
+
     def _format_parameters(self, template, indent, parameters):
         lines = []
         for param in sorted(parameters, key=attrgetter('name')):
@@ -198,52 +228,130 @@ class OptionParser(optparse.OptionParser):
 class Runtime(object):
     """The bake runtime."""
 
-    flags = ('color', 'debug', 'dryrun', 'interactive', 'nocolor', 'quiet', 'strict',
-        'timestamps', 'timing', 'verbose')
+    flags = ('color', 'debug', 'dryrun', 'force', 'interactive', 'monorepo', 'nocolor',
+        'persistent', 'profile', 'profilemerge', 'quiet', 'strict', 'timestamps', 'timing',
+        'verbose')
+
+    fingerprints = None
+    preloaded = None
 
     def __init__(self, executable='bake', environment=None, stream=sys.stdout,
             modules=None, **params):
 
         self.completed = []
-        self.context = []
-        self.environment = Environment(environment)
+        self.deferred = {}
+        self.persistent = params.get('persistent', False)
+        if self.persistent:
+            self.environment = PersistentEnvironment(environment)
+        else:
+            self.environment = Environment(environment)
         self.executable = executable
+        self.local = local()
+        self.lock = RLock()
         self.logfiles = []
         self.modules = []
+        self.pending = {}
+        self.pool = None
+        self.profiler = None
         self.queue = []
+        self.results = ResultCache()
         self.sources = []
+        self.state = {}
         self.stream = stream
+        self.subprojects = {}
+        self.tracer = None
 
         self.color = params.get('color', False)
         self.debug = params.get('debug', False)
         self.dryrun = params.get('dryrun', False)
+        self.force = params.get('force', False)
         self.interactive = params.get('interactive', False)
         self.isolated = params.get('isolated', False)
+        self.jobs = params.get('jobs', 1)
+        self.monorepo = params.get('monorepo', False)
         self.nocolor = params.get('nocolor', False)
         self.nobakefile = params.get('nobakefile', False)
         self.nosearch = params.get('nosearch', False)
         self.path = params.get('path', None)
         self.prefix = params.get('prefix', None)
+        self.profile = params.get('profile', False)
+        self.profiledir = params.get('profiledir', None)
+        self.profilemerge = params.get('profilemerge', False)
         self.quiet = params.get('quiet', False)
         self.strict = params.get('strict', False)
         self.timestamps = params.get('timestamps', False)
         self.timing = params.get('timing', False)
         self.verbose = params.get('verbose', False)
 
+    @property
+    def context(self):
+        try:
+            return self.local.context
+        except AttributeError:
+            context = self.local.context = []
+            return context
+
     @property
     def curdir(self):
-        return path(os.getcwd())
+        """The working directory of the executing task. Tasks of sub-projects, and all tasks
+        when tasks execute concurrently, leave the working directory of the process unchanged,
+        and each thread tracks its own instead."""
+
+        from bake.path import path
+        return path(getattr(self.local, 'path', None) or os.getcwd())
+
+    @property
+    def catalog(self):
+        """A mapping of each source to the tasks it declares, by name, including the entries
+        for tasks whose sources have not been imported."""
+
+        catalog = {}
+        for source, tasks in Tasks.by_source.items():
+            catalog[source] = dict(tasks)
+        for target, source, namespace, tasks in self.pending.values():
+            for task in tasks:
+                entries = catalog.setdefault(task['source'], {})
+                if task['name'] not in entries:
+                    entries[task['name']] = TaskEntry(**task)
+        return catalog
+
+    @property
+    def durations(self):
+        return self.get_state('durations')
+
+    @property
+    def manifest(self):
+        return Manifest(self.get_state('manifest'))
+
+    @property
+    def stamps(self):
+        return self.get_state('stamps')
 
     @property
     def use_color(self):
         return (self.color and not self.nocolor)
 
+    def begin_capture(self):
+        self.local.captured = []
+
     def chdir(self, path):
+        """Changes the working directory of the executing task to ``path``, returning the
+        previous one.
+
+        Where the working directory is tracked per thread, as for tasks of sub-projects and all
+        tasks under ``-j``, only :attr:`curdir` changes, along with the working directory of the
+        processes the task runs; the working directory of this process is unchanged. Tasks
+        which may execute in that manner must therefore resolve relative paths against
+        :attr:`curdir` rather than pass them to ``open()`` or ``os`` functions directly."""
+
         curdir = self.curdir
         if self.verbose:
             self.info('changing directory to %s' % path)
 
-        os.chdir(str(path))
+        if getattr(self.local, 'path', None):
+            self.local.path = os.path.normpath(os.path.join(curdir, str(path)))
+        else:
+            os.chdir(str(path))
         return curdir
 
     def check(self, message, default=False):
@@ -259,10 +367,15 @@ class Runtime(object):
             elif response[0] == 'n':
                 return False
 
+    def end_capture(self):
+        captured, self.local.captured = self.local.captured, None
+        return captured
+
     def error(self, message, exception=False, asis=False):
         if not message:
             return
         if exception:
+            from traceback import format_exc
             message = '[!R]%s[!]\n%s' % (message.rstrip(), format_exc())
         self._report_message(message, asis)
 
@@ -271,17 +384,37 @@ class Runtime(object):
             environment = self.environment.overlay(environment, **params)
 
         if isinstance(task, string):
-            task = Tasks.get(task)(self)
+            task = self._get_task(task)(self)
         
+        curdir = getattr(self.local, 'path', None)
         if task.independent:
-            self._reset_path()
+            if task.namespace:
+                self.local.path = os.path.join(self.path, *task.namespace.split('/'))
+            else:
+                self._reset_path()
 
         self.context.append(task.name)
         try:
-            if task.execute(environment) is False:
-                raise TaskFailed()
+            with self.trace(task.name, 'task', fullname=task.fullname) as span:
+                try:
+                    if task.execute(environment) is False:
+                        raise TaskFailed()
+                finally:
+                    if task.usage:
+                        span.annotate(usage=task.usage)
         finally:
             self.context.pop()
+            if task.independent:
+                self.local.path = curdir
+            if task.started is not None and task.finished is not None:
+                self._record_duration(task)
+
+    def get_state(self, name):
+        with self.lock:
+            state = self.state.get(name)
+            if state is None:
+                state = self.state[name] = State(name, self.path or os.getcwd())
+            return state
 
     def info(self, message, asis=False, debug=False):
         if debug and not self.debug:
@@ -292,103 +425,44 @@ class Runtime(object):
         self._report_message(message, asis)
 
     def invoke(self, invocation):
-        parser = OptionParser()
         try:
-            options, arguments = parser.parse_args(invocation)
-        except RuntimeError as exception:
-            self.error(exception.args[0])
-            return False
-
-        if options.isolated:
-            self.isolated = True
-
-        if not self.isolated and BAKEOPTS in os.environ:
-            base_invocation = shlex.split(os.environ[BAKEOPTS])
-            try:
-                base_options, _ = parser.parse_args(base_invocation)
-            except RuntimeError as exception:
-                self.error(exception.args[0] + ' (specified in BAKEOPTS)')
-                return False
-            else:
-                options = parser.merge_values(base_options, options)
-                   
-        if options.version:
-            return self._display_version()
-
-        self._parse_options(options.__dict__, True)
-        if options.nobakefile:
-            self.nobakefile = True
-        if options.nosearch:
-            self.nosearch = True
-        if options.path:
-            self.path = options.path
-        if options.prefix:
-            self.prefix = options.prefix
-
-        sys.path.insert(0, '.')
-        if self.path:
-            if self._reset_path() is False:
-                return False
-        else:
-            self.path = os.getcwd()
-
-        if not self.isolated:
-            if self._parse_config_file() is False:
-                return False
-            if not self.nobakefile:
-                if self._load_bakefiles(self.nosearch) is False:
-                    return False
-
-        if self._parse_options(options.__dict__) is False:
-            return False
-
-        if options.help:
-            return self._display_help(parser, arguments, options.pattern)
-
-        if options.params:
-            for pair in options.params:
-                param, value = parse_argument_pair(pair)
-                self.environment.set(param, value)
-
-        self.queue = self._parse_arguments(arguments)
-        if self.queue is False:
-            return False
-
-        try:
-            self.run()
-        except TaskError as exception:
-            self.error(exception.args[0])
-            return False
+            return self._invoke(invocation)
+        finally:
+            self._save_state()
+            if self.tracer:
+                self._write_trace()
+            if self.profiler:
+                self._write_profiles()
 
     def linefeed(self, lines=1):
         if self.quiet:
             return
         self._report_message('\n' * lines, True)
 
-    def load(self, target, is_filename=False):
+    def load(self, target, is_filename=False, namespace=None):
         self.info('attempting to load module: %s' % target, debug=True)
 
-        environment = None
-        try:
-            source = None
-            if is_filename or target[-3:] == '.py':
-                source = path(target).relpath()
+        source = None
+        if is_filename or target[-3:] == '.py':
+            source = os.path.relpath(target)
 
-            Tasks.begin_declaration(source)
-            try:
+        key = os.path.abspath(target) if source else target
+        if self.preloaded is not None and key in self.preloaded:
+            environment = deepcopy(self.preloaded[key])
+        elif self.preloaded is None and self._defer(key, target, source, namespace):
+            environment = deepcopy(self.manifest.get(key, namespace)['environment'])
+        else:
+            with self.trace('import', 'load', target=target):
+                environment = self._import(key, target, source, namespace)
+            if environment is False:
+                return False
+
+            if self.preloaded is not None:
+                self.preloaded[key] = deepcopy(environment)
                 if source:
-                    import_source(target)
+                    self._fingerprint(key)
                 else:
-                    import_object(target)
-            finally:
-                environment = Tasks.end_declaration()
-        except Exception:
-            if self.interactive:
-                if not self.check('failed to load %r; continue?' % target):
-                    return False
-            else:
-                self.error('failed to load %r' % target, True)
-                return False
+                    self._fingerprint(getattr(sys.modules.get(target), '__file__', None))
 
         if not environment:
             return
@@ -415,12 +489,45 @@ class Runtime(object):
         else:
             return response
     
+    def pipeline(self, *cmdlines, **params):
+        """Runs ``cmdlines`` as a :class:`bake.process.Pipeline` and returns it once finished,
+        raising :exc:`bake.process.ProcessFailedError` if any of its processes fails. Accepts
+        ``data``, ``timeout`` and ``cwd``, and the parameters of :class:`bake.process.Pipeline`
+        as keyword arguments."""
+
+        from bake.process import Pipeline
+
+        run = dict((name, params.pop(name)) for name in ('data', 'timeout', 'cwd')
+            if name in params)
+        run['cwd'] = self._get_cwd(run.get('cwd'))
+
+        report = None
+        capturing = self._is_capturing()
+        if self.verbose:
+            report = self.report
+            params.setdefault('passthrough', not capturing)
+
+        pipeline = Pipeline(cmdlines, **params)
+        with self.trace('pipeline', 'shell', cmdlines=list(cmdlines)):
+            pipeline.run(report=report, **run)
+
+        if self.verbose and capturing:
+            for process in pipeline.processes:
+                if process.stderr:
+                    self.report(process.stderr.rstrip('\n'))
+        return pipeline
+
     def report(self, message, asis=False):
         if not message or self.quiet:
             return
         self._report_message(message, asis)
 
     def retrieve(self, url, filename):
+        try:
+            from urllib import urlretrieve
+        except ImportError:
+            from urllib.request import urlretrieve
+
         try:
             urlretrieve(url, filename)
         except Exception:
@@ -436,29 +543,47 @@ class Runtime(object):
             tasks[task.name].add(task)
 
         graph = {}
-        while queue:
-            task = queue.pop(0)
-            graph[task] = task.dependencies
-
-            if task.requires:
-                for requirement in task.requires:
-                    if requirement not in tasks:
-                        required_task = Tasks.get(requirement)(self, independent=True)
-                        tasks[requirement].add(required_task)
-                        queue.append(required_task)
-                    task.dependencies.update(tasks[requirement])
-
-        self.queue = topological_sort(graph)
-        while self.queue:
-            task = self.queue.pop(0)
-            try:
-                self.execute(task, self.environment)
-            except TaskFailed:
-                return False
-            else:
-                self.completed.append(task)
+        with self.trace('construct graph', 'graph'):
+            while queue:
+                task = queue.pop(0)
+                graph[task] = task.dependencies
+
+                if task.requires:
+                    for requirement in task.requires:
+                        requirement = self._get_task(requirement, task.namespace).name
+                        if requirement not in tasks:
+                            required_task = self._get_task(requirement)(self, independent=True)
+                            tasks[requirement].add(required_task)
+                            queue.append(required_task)
+                        task.dependencies.update(tasks[requirement])
+
+        from bake.scheduler import ProcessPool
+        self.pool = ProcessPool.create(self, graph, self.jobs)
+        try:
+            if self.jobs > 1 and self.profiler:
+                self.warn('executing tasks serially while profiling')
+            elif self.jobs > 1 and not self.interactive:
+                from bake.scheduler import Scheduler
+                return Scheduler(self, graph, self.jobs).run()
+
+            with self.trace('sort graph', 'graph'):
+                self.queue = topological_sort(graph)
+            while self.queue:
+                task = self.queue.pop(0)
+                try:
+                    self.execute(task, self.environment)
+                except TaskFailed:
+                    return False
+                else:
+                    self.completed.append(task)
+        finally:
+            if self.pool:
+                self.pool.close()
+                self.pool = None
+            self._save_state()
 
     def run_script(self, script):
+        from tempfile import mkstemp
         fileno, filename = mkstemp('.sh', 'bake')
         os.write(fileno, dedent(script))
         os.close(fileno)
@@ -467,16 +592,80 @@ class Runtime(object):
         os.unlink(filename)
 
     def shell(self, cmdline, data=None, environ=None, shell=False, timeout=None,
-            merge_output=False, passthrough=False):
+            merge_output=False, passthrough=False, on_line=None, tee=None, capture=False,
+            cwd=None):
+        """Runs ``cmdline`` and returns the finished :class:`bake.process.Process`, raising
+        :exc:`bake.process.ProcessFailedError` if it exits with a non-zero return code.
+
+        If ``on_line`` is specified, it receives each line of output as it arrives, as described
+        for :class:`bake.process.Process`. If ``tee`` is true, each line is also reported; if it
+        is a file, each line is also written to it. If ``capture`` is true, output is captured
+        with bounded memory by a :class:`bake.process.Capture`."""
+
+        from bake.process import Process
 
         report = None
         if self.verbose:
-            report, passthrough = self.report, True
-
-        process = Process(cmdline, environ, shell, merge_output, passthrough)
-        process.run(data, timeout, report)
+            report = self.report
+            passthrough, tee = self._get_passthrough(passthrough, tee,
+                on_line or capture)
+
+        process = Process(cmdline, environ, shell, merge_output, passthrough,
+            self._get_line_callback(on_line, tee), capture)
+        with self.trace('shell', 'shell', cmdline=cmdline):
+            process.run(data, timeout, report, self._get_cwd(cwd))
         return process
 
+    def shell_lines(self, cmdline, data=None, environ=None, shell=False, timeout=None,
+            merge_output=False, on_line=None, tee=None, cwd=None):
+        """Runs ``cmdline``, yielding each line of its standard output as it arrives, and raises
+        :exc:`bake.process.ProcessFailedError` once it exits if its return code is non-zero.
+        Lines written to standard error are handled as described for :meth:`shell`."""
+
+        from bake.process import Process, ProcessFailedError
+
+        report = None
+        if self.verbose:
+            report = self.report
+
+        process = Process(cmdline, environ, shell, merge_output,
+            on_line=self._get_line_callback(on_line, tee))
+        with self.trace('shell', 'shell', cmdline=cmdline):
+            for line in process.iterate(data, timeout, report, self._get_cwd(cwd)):
+                if tee:
+                    self._tee_line(tee, line)
+                yield line
+
+        if process.returncode != 0:
+            raise ProcessFailedError(process.returncode, process)
+
+    def shell_many(self, cmdlines, concurrency=None, data=None, environ=None, shell=False,
+            timeout=None, merge_output=False, passthrough=False, on_line=None, tee=None,
+            capture=False, cwd=None):
+
+        from bake.process import Process, run_processes
+
+        if concurrency is None:
+            from multiprocessing import cpu_count
+            concurrency = cpu_count()
+
+        if self.verbose:
+            passthrough, tee = self._get_passthrough(passthrough, tee,
+                on_line or capture)
+
+        on_line = self._get_line_callback(on_line, tee)
+        processes = []
+        for cmdline in cmdlines:
+            process = Process(cmdline, environ, shell, merge_output, passthrough, on_line,
+                capture)
+            if self.verbose:
+                self.report('shell: %s' % ' '.join(process.cmdline))
+            processes.append(process)
+
+        with self.trace('shell', 'shell', concurrency=concurrency,
+                cmdlines=[process.cmdline for process in processes]):
+            return run_processes(processes, concurrency, data, timeout, self._get_cwd(cwd))
+
     def spawn(self, cmdline, environment=None):
         if isinstance(cmdline, string):
             cmdline = shlex.split(cmdline)
@@ -488,17 +677,74 @@ class Runtime(object):
         else:
             os.execvp(cmdline[0], cmdline)
 
+    def trace(self, name, category='bake', **args):
+        """Returns a context manager which records a span named ``name`` around its block in
+        the trace of this run, if one is being written."""
+
+        if self.tracer is None:
+            return NullSpan
+        return self.tracer.span(name, category, **args)
+
     def warn(self, message, asis=False):
         if not message or self.quiet:
             return
         return self._report_message(message, asis)
 
+    def watch(self, arguments):
+        """Runs the tasks specified by ``arguments``, then runs them again each time files under
+        the runtime path change, until interrupted. Bakefiles and modules remain loaded between
+        runs, and changes made while tasks execute are disregarded."""
+
+        from bake.watch import create_watcher
+        watcher = create_watcher(self.path)
+        try:
+            while True:
+                self.completed = []
+                self.queue = self._parse_arguments(arguments)
+                if self.queue is False:
+                    return False
+
+                try:
+                    self.run()
+                except TaskError as exception:
+                    self.error(exception.args[0])
+
+                watcher.discard()
+                self.report('[!b]watching %s for changes[!]' % self.path)
+
+                changes = watcher.wait()
+                self.info('detected changes to %s' % ', '.join(sorted(changes)))
+                self._reset_path()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+
+    def _defer(self, key, target, source, namespace):
+        entry = self.manifest.get(key, namespace)
+        if not entry:
+            return False
+
+        self.info('deferring load of %s' % target, debug=True)
+        deferred = self.deferred
+        for task in entry['tasks']:
+            if source:
+                task['source'] = source
+            for name in (task['name'], task['fullname']):
+                if name in deferred:
+                    deferred[name].append(key)
+                else:
+                    deferred[name] = [key]
+
+        self.pending[key] = (target, source, namespace, entry['tasks'])
+        return True
+
     def _display_help(self, parser, arguments, pattern=None):
         if not arguments:
-            self.report(parser.generate_help(self))
+            self.report(parser.generate_help(self, pattern))
             return
 
-        task = self._find_task(arguments[0])
+        task = self._find_task(arguments[0], True)
         if task and task is not True:
             self.report(parser.generate_task_help(self, task))
             return True
@@ -508,9 +754,9 @@ class Runtime(object):
     def _display_version(self):
         self.report('bake 2.0')
 
-    def _find_task(self, name):
+    def _find_task(self, name, deferred=False):
         try:
-            task = Tasks.get(name, self.prefix)
+            task = self._get_task(name, deferred=deferred)
         except MultipleTasksError as exception:
             self.error('multiple tasks')
             return False
@@ -520,32 +766,276 @@ class Runtime(object):
             else:
                 self.error('cannot find task %r' % name)
                 return False
+        except TaskError as exception:
+            self.error(exception.args[0])
+            return False
         else:
             return task
 
-    def _load_bakefiles(self, nosearch=False):
-        candidates = []
-        path = self.path
+    def _get_line_callback(self, on_line, tee):
+        if not tee:
+            return on_line
+
+        def callback(line, stream):
+            self._tee_line(tee, line)
+            if on_line:
+                on_line(line, stream)
+        return callback
+
+    def _get_cwd(self, cwd=None):
+        path = getattr(self.local, 'path', None)
+        if not path:
+            return cwd
+        elif cwd is not None:
+            return os.path.join(path, cwd)
+        elif path != os.getcwd():
+            return path
+
+    def _get_passthrough(self, passthrough, tee, piped):
+        if piped or tee or self._is_capturing():
+            return passthrough, tee or True
+        return True, tee
+
+    def _get_task(self, name, namespace=None, deferred=False):
+        """Returns the task named ``name``, importing the source which declares it if its
+        load was deferred, unless ``deferred`` is true, in which case its manifest entry is
+        returned instead."""
+
+        if namespace and ':' not in name:
+            try:
+                return self._get_task('%s:%s' % (namespace, name), deferred=deferred)
+            except UnknownTaskError:
+                pass
 
-        while True:
-            for bakefile in BAKEFILES:
-                candidate = os.path.join(path, bakefile)
-                if os.path.exists(candidate):
-                    candidates.insert(0, candidate)
+        if ':' in name and self.subprojects:
+            namespace, name = name.rsplit(':', 1)
+            name = '%s:%s' % (self._load_subproject(namespace), name)
 
-            if path == self.path and nosearch:
-                break
+        candidates = [name]
+        if self.prefix and not name.startswith(self.prefix):
+            candidates.append(self.prefix + name)
 
-            up = os.path.dirname(path)
-            if up != path:
-                path = up
+        for candidate in candidates:
+            if candidate not in self.deferred:
+                continue
+            if deferred:
+                entries = [task for key in self.deferred[candidate] if key in self.pending
+                    for task in self.pending[key][3]
+                    if candidate in (task['name'], task['fullname'])]
+                if len(entries) == 1 and candidate not in Tasks.by_name:
+                    return TaskEntry(**entries[0])
+            for key in self.deferred.pop(candidate):
+                if key in self.pending:
+                    target, source, namespace, tasks = self.pending.pop(key)
+                    if self._import(key, target, source, namespace) is False:
+                        raise TaskError('failed to load %r' % target)
+
+        return Tasks.get(name, self.prefix)
+
+    def _import(self, key, target, source, namespace):
+        tasks = set(Tasks.by_fullname.values())
+        modules = set(sys.modules)
+
+        environment = None
+        try:
+            Tasks.begin_declaration(source, namespace)
+            try:
+                if source:
+                    import_source(target)
+                else:
+                    import_object(target)
+            finally:
+                environment = Tasks.end_declaration()
+        except Exception:
+            if self.interactive:
+                if not self.check('failed to load %r; continue?' % target):
+                    return False
+                return None
             else:
-                break
+                self.error('failed to load %r' % target, True)
+                return False
+
+        files = [key] if source else []
+        for name in set(sys.modules) - modules:
+            if source or name == target or name.startswith(target + '.'):
+                filename = getattr(sys.modules[name], '__file__', None)
+                if filename and filename[-4:] in ('.pyc', '.pyo'):
+                    if os.path.exists(filename[:-1]):
+                        filename = filename[:-1]
+                if filename:
+                    files.append(os.path.abspath(filename))
+        if files:
+            tasks = [TaskEntry.describe(task, source or task.__module__)
+                for task in set(Tasks.by_fullname.values()) - tasks]
+            self.manifest.record(key, namespace, files, environment, tasks)
+
+        return environment
+
+    def _invoke(self, invocation, partial=None, output=None):
+        if invocation[:1] == ['--complete']:
+            output = self.stream
+            with open(os.devnull, 'w') as devnull:
+                self.stream = devnull
+                try:
+                    return self._invoke(invocation[1:-1], (invocation[1:] or [''])[-1], output)
+                finally:
+                    self.stream = output
+
+        parser = OptionParser()
+        try:
+            options, arguments = parser.parse_args(invocation)
+        except RuntimeError as exception:
+            self.error(exception.args[0])
+            return False
+
+        if options.isolated:
+            self.isolated = True
+
+        if not self.isolated and BAKEOPTS in os.environ:
+            base_invocation = shlex.split(os.environ[BAKEOPTS])
+            try:
+                base_options, _ = parser.parse_args(base_invocation)
+            except RuntimeError as exception:
+                self.error(exception.args[0] + ' (specified in BAKEOPTS)')
+                return False
+            else:
+                options = parser.merge_values(base_options, options)
+                   
+        if options.version and partial is None:
+            return self._display_version()
+
+        if options.trace and partial is None:
+            from bake.trace import Tracer
+            self.tracer = Tracer(os.path.abspath(options.trace))
+        if options.profiledir:
+            self.profiledir = os.path.abspath(options.profiledir)
+
+        if self.load('bake.lib') is False:
+            return False
+
+        self._parse_options(options.__dict__, True)
+        if options.nobakefile:
+            self.nobakefile = True
+        if options.nosearch:
+            self.nosearch = True
+        if options.path:
+            self.path = options.path
+        if options.prefix:
+            self.prefix = options.prefix
+
+        sys.path.insert(0, '.')
+        if self.path:
+            if self._reset_path() is False:
+                return False
+        else:
+            self.path = os.getcwd()
+
+        if options.daemon:
+            Runtime.fingerprints, Runtime.preloaded = {}, {}
+
+        if not self.isolated:
+            if self._parse_config_file() is False:
+                return False
+            if not self.nobakefile:
+                with self.trace('load bakefiles', 'load'):
+                    if self._load_bakefiles(self.nosearch) is False:
+                        return False
+
+        if self._parse_options(options.__dict__) is False:
+            return False
+
+        if partial is not None:
+            from bake.complete import complete
+            candidates = complete(self, parser.Options, arguments, partial)
+            if candidates:
+                output.write('\n'.join(candidates) + '\n')
+            return
+
+        if options.daemon:
+            from bake.daemon import Daemon
+            return Daemon(self).serve()
+
+        if options.help:
+            return self._display_help(parser, arguments, options.pattern)
+
+        if options.params:
+            for pair in options.params:
+                param, value = parse_argument_pair(pair)
+                self.environment.set(param, value)
+
+        if self.profile:
+            from bake.profiling import Profiler
+            directory = self.profiledir or get_cache_path('profiles', get_project_key(self.path))
+            self.profiler = Profiler(directory, self.profilemerge)
+
+        if options.watch:
+            return self.watch(arguments)
+
+        self.queue = self._parse_arguments(arguments)
+        if self.queue is False:
+            return False
+
+        try:
+            if self.run() is False:
+                return False
+        except TaskError as exception:
+            self.error(exception.args[0])
+            return False
+
+    def _is_capturing(self):
+        return getattr(self.local, 'captured', None) is not None
+
+    def _load_bakefiles(self, nosearch=False):
+        from bake.discovery import find_ancestor_bakefiles, find_subprojects
+        layout = self.get_state('layout')
+
+        candidates, ancestors = find_ancestor_bakefiles(self.path, BAKEFILES,
+            layout.get('ancestors', {}), nosearch)
+        if ancestors != layout.get('ancestors'):
+            layout.set('ancestors', ancestors)
+
+        if self.fingerprints is not None:
+            for directory in ancestors:
+                for bakefile in BAKEFILES:
+                    self._fingerprint(os.path.join(directory, bakefile))
 
         for candidate in candidates:
             if self.load(candidate, True) is False:
                 return False
 
+        if self.monorepo:
+            subprojects, entries = find_subprojects(self.path, BAKEFILES,
+                layout.get('subprojects', {}))
+            if entries != layout.get('subprojects'):
+                layout.set('subprojects', entries)
+            self.subprojects = {}
+            for namespace, bakefile in subprojects.items():
+                if '.' in namespace:
+                    self.warn('ignoring sub-project %r, as namespaces cannot contain periods'
+                        % namespace)
+                else:
+                    self.subprojects[namespace] = [bakefile, False]
+
+    def _load_subproject(self, namespace):
+        if namespace in self.subprojects:
+            candidates = [namespace]
+        else:
+            candidates = [candidate for candidate in self.subprojects
+                if candidate.endswith('/' + namespace)]
+            if not candidates:
+                raise UnknownTaskError('no sub-project named %r' % namespace)
+            elif len(candidates) > 1:
+                raise TaskError('multiple sub-projects named %r: %s'
+                    % (namespace, ', '.join(sorted(candidates))))
+
+        namespace = candidates[0]
+        subproject = self.subprojects[namespace]
+        if not subproject[1]:
+            subproject[1] = True
+            if self.load(subproject[0], True, namespace) is False:
+                raise TaskError('failed to load sub-project %r' % namespace)
+        return namespace
+
     def _parse_arguments(self, arguments):
         parameters = None
         task = None
@@ -575,8 +1065,19 @@ class Runtime(object):
 
         return tasks
 
+    def _fingerprint(self, path):
+        if path:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.fingerprints[path] = None
+            else:
+                self.fingerprints[path] = [stat.st_mtime, stat.st_size]
+
     def _parse_config_file(self):
         path = os.path.join(user_config_dir('bake'), BAKECONFIG)
+        if self.fingerprints is not None:
+            self._fingerprint(path)
         if os.path.exists(path):
             return self._parse_source(path)
 
@@ -586,10 +1087,21 @@ class Runtime(object):
             if flagged:
                 setattr(self, flag, True)
 
+        if self.persistent and not isinstance(self.environment, PersistentEnvironment):
+            self.environment = PersistentEnvironment(self.environment.environment)
+
         logfiles = options.get('logfiles', None)
         if logfiles:
             self.logfiles.extend(logfiles)
 
+        jobs = options.get('jobs')
+        if jobs:
+            try:
+                self.jobs = int(jobs)
+            except ValueError:
+                self.error('invalid number of jobs: %r' % jobs)
+                return False
+
         if partial:
             return
 
@@ -614,7 +1126,14 @@ class Runtime(object):
     def _parse_source(self, path):
         self.info('attempting to parse source: %s' % path, debug=True)
         try:
-            options = self.environment.parse(path)
+            data = None
+            if self.preloaded is not None:
+                key = os.path.abspath(path)
+                if key not in self.preloaded:
+                    self.preloaded[key] = Environment.read(path)
+                    self._fingerprint(key)
+                data = deepcopy(self.preloaded[key])
+            options = self.environment.parse(path, data)
         except RuntimeError as exception:
             if self.interactive:
                 return self.check('%s; continue?' % exception.args[0])
@@ -631,7 +1150,20 @@ class Runtime(object):
         if options:
             return self._parse_options(options)
 
+    def _record_duration(self, task):
+        elapsed = task.elapsed
+        previous = self.durations.get(task.fullname)
+        if previous is not None:
+            elapsed = (previous + elapsed) / 2.0
+        self.durations.set(task.fullname, elapsed)
+        if task.usage:
+            self.get_state('usage').set(task.fullname, dict(task.usage, elapsed=task.elapsed))
+
     def _report_message(self, message, asis=False):
+        captured = getattr(self.local, 'captured', None)
+        if captured is not None:
+            captured.append((message, asis))
+
         if self.context and not asis:
             message = '[!b][%s][!] %s ' % (' '.join(self.context), message)
         if self.timestamps:
@@ -639,14 +1171,19 @@ class Runtime(object):
         if message[-1] != '\n':
             message += '\n'
 
-        self.stream.write(ansify(message, self.color))
-        self.stream.flush()
-
-    def _reset_path(self):
-        path = self.path
-        if path == os.getcwd():
+        with self.lock:
+            self.stream.write(ansify(message, self.color))
+            self.stream.flush()
+
+    def _reset_path(self, path=None):
+        path = path or self.path
+        if getattr(self.local, 'path', None):
+            if os.path.isdir(path):
+                self.local.path = path
+                return
+        elif path == os.getcwd():
             return
-        
+
         try:
             os.chdir(path)
         except OSError as exception:
@@ -656,6 +1193,38 @@ class Runtime(object):
                 self.error('failed to change path to %r' % path)
                 return False
 
+    def _save_state(self):
+        for state in list(self.state.values()):
+            state.save()
+
+    def _write_profiles(self):
+        profiler = self.profiler
+        if not profiler.stats:
+            return
+
+        try:
+            profiler.write(self.warn)
+        except (IOError, OSError) as exception:
+            self.error('failed to write profiles to %r: %s' % (profiler.directory, exception))
+        else:
+            self.report('profile statistics written to %s' % profiler.directory)
+
+        for fullname in sorted(profiler.stats):
+            self.report('profile of %s:' % fullname)
+            self.report(profiler.summarize(fullname), True)
+
+    def _write_trace(self):
+        try:
+            self.tracer.write()
+        except (IOError, OSError) as exception:
+            self.error('failed to write trace to %r: %s' % (self.tracer.path, exception))
+
+    def _tee_line(self, tee, line):
+        if tee is True:
+            self.report(line)
+        else:
+            tee.write(line + '\n')
+
 def run(**params):
     runtime = Runtime(os.path.basename(sys.argv[0]), **params)
     exitcode = 0
@@ -0,0 +1,244 @@
+import os
+import sys
+from collections import defaultdict
+from heapq import heappop, heappush
+from threading import Thread
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+from bake.environment import *
+from bake.exceptions import *
+from bake.persistent import PersistentMap
+from bake.task import Tasks
+from bake.util import topological_sort
+
+__all__ = ('ProcessPool', 'Scheduler')
+
+class ProcessPool(object):
+    """A pool of worker processes which execute tasks declaring ``executor = 'process'``.
+
+    The pool is forked from the runtime after all tasks have been loaded, so workers resolve
+    task classes by fullname; only the task parameters and a snapshot of the environment are
+    shipped to the worker, and the resulting status, timing, resource usage, environment mutations
+    and reported messages are shipped back.
+
+    A pool is created for each run, serial or concurrent, which includes such a task, except in
+    interactive mode and while profiling, or where the platform cannot fork; such tasks are then
+    executed within the runtime, as are tasks which cannot be serialized.
+    """
+
+    def __init__(self, runtime, processes):
+        import multiprocessing
+
+        self.runtime = runtime
+        try:
+            context = multiprocessing.get_context('fork')
+        except AttributeError:
+            context = multiprocessing
+        self.pool = context.Pool(processes)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    @classmethod
+    def create(cls, runtime, tasks, processes):
+        """Returns a pool of ``processes`` workers for the run of ``tasks`` by ``runtime``, or
+        ``None`` if no pool is needed."""
+
+        if runtime.interactive or runtime.profiler or not hasattr(os, 'fork'):
+            return None
+        for task in tasks:
+            if task.executor == 'process':
+                return cls(runtime, processes)
+
+    def execute(self, task):
+        runtime = self.runtime
+        settings = dict((flag, getattr(runtime, flag)) for flag in runtime.flags)
+        settings.update(executable=runtime.executable, path=runtime.path, timestamps=False)
+
+        try:
+            payload = pickle.dumps((task.fullname, task.params, task.environment.snapshot(),
+                runtime.environment.snapshot(), settings, str(runtime.curdir),
+                bool(runtime.tracer), runtime._is_capturing()), pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            runtime.info('cannot serialize task for worker process', debug=True)
+            return task._execute_task(runtime)
+
+        result = self.pool.apply(execute_task, (payload,))
+        for message, asis in result['messages']:
+            runtime._report_message(message, asis)
+
+        task.status = result['status']
+        task.started = result['started']
+        task.finished = result['finished']
+        task.usage = result['usage']
+        if result['events']:
+            runtime.tracer.extend(result['events'])
+
+        if result['environment']:
+            task.environment.merge(result['environment'])
+        if result['runtime']:
+            with runtime.lock:
+                runtime.environment.merge(result['runtime'])
+
+class Scheduler(object):
+    """Executes a graph of tasks concurrently, dispatching each task to a pool of worker threads
+    as soon as all of its dependencies have completed.
+
+    Worker threads never change the working directory of the process; the working directory of
+    each task is tracked by its thread, as :attr:`Runtime.curdir`, and applied to the processes
+    it runs and the inputs and outputs it declares.
+
+    Ready tasks are started in order of the longest path of remaining work from each task to the
+    end of the graph, weighing each task by its historical duration, so that tasks on the
+    critical path start first. Tasks without history are weighed by the mean of the known
+    durations, or uniformly when there is no history at all.
+    """
+
+    def __init__(self, runtime, graph, jobs):
+        self.graph = graph
+        self.jobs = jobs
+        self.results = Queue()
+        self.runtime = runtime
+        self.tasks = Queue()
+
+    def run(self):
+        runtime = self.runtime
+        order = topological_sort(self.graph)
+
+        pending = {}
+        dependents = defaultdict(list)
+        for task, dependencies in self.graph.items():
+            pending[task] = len(dependencies)
+            for dependency in dependencies:
+                dependents[dependency].append(task)
+
+        priorities = self._prioritize(order, dependents)
+        sequence = dict((task, i) for i, task in enumerate(order))
+
+        ready = []
+        for task in order:
+            if not pending[task]:
+                heappush(ready, (-priorities[task], sequence[task], task))
+
+        workers = []
+        for i in range(min(self.jobs, len(self.graph))):
+            worker = Thread(target=self._work, name='bake-worker-%d' % (i + 1))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        failed, error, running = False, None, 0
+        try:
+            while True:
+                while ready and running < len(workers) and not (failed or error):
+                    self.tasks.put(heappop(ready)[2])
+                    running += 1
+
+                if not running:
+                    break
+
+                task, succeeded, exception = self.results.get()
+                running -= 1
+
+                if exception:
+                    error = error or exception
+                elif not succeeded:
+                    failed = True
+                else:
+                    runtime.completed.append(task)
+                    for dependent in dependents[task]:
+                        pending[dependent] -= 1
+                        if not pending[dependent]:
+                            heappush(ready, (-priorities[dependent], sequence[dependent],
+                                dependent))
+        finally:
+            for worker in workers:
+                self.tasks.put(None)
+            for worker in workers:
+                worker.join()
+
+        if error:
+            raise error
+        if failed:
+            return False
+
+    def _prioritize(self, order, dependents):
+        durations = self.runtime.durations
+        weights = {}
+        for task in order:
+            weights[task] = durations.get(task.fullname)
+
+        known = [weight for weight in weights.values() if weight is not None]
+        default = (sum(known) / len(known)) if known else 1.0
+
+        priorities = {}
+        for task in reversed(order):
+            weight = weights[task]
+            if weight is None:
+                weight = default
+            remaining = [priorities[dependent] for dependent in dependents[task]]
+            priorities[task] = weight + max(remaining or [0])
+        return priorities
+
+    def _work(self):
+        runtime = self.runtime
+        runtime.local.path = runtime.path
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+
+            try:
+                runtime.execute(task, runtime.environment)
+            except TaskFailed:
+                self.results.put((task, False, None))
+            except Exception:
+                self.results.put((task, False, sys.exc_info()[1]))
+            else:
+                self.results.put((task, True, None))
+
+def execute_task(payload):
+    """Executes a task within a worker process of a :class:`ProcessPool`."""
+
+    from bake.runtime import Runtime
+
+    fullname, params, environment, base, settings, curdir, traced, capturing = pickle.loads(
+        payload)
+    if os.getcwd() != curdir:
+        os.chdir(curdir)
+
+    messages = []
+    layer = PersistentEnvironment if isinstance(base, PersistentMap) else Environment
+    runtime = Runtime(**settings)
+    runtime.environment = layer(base).overlay()
+    runtime._report_message = lambda message, asis=False: messages.append((message, asis))
+    if capturing:
+        runtime.begin_capture()
+    if traced:
+        from bake.trace import Tracer
+        runtime.tracer = Tracer()
+
+    task = Tasks.by_fullname[fullname](runtime, params)
+    task.environment = layer(environment).overlay()
+    task._execute_task(runtime)
+
+    return {
+        'status': task.status,
+        'started': task.started,
+        'finished': task.finished,
+        'usage': task.usage,
+        'events': runtime.tracer.events if traced else None,
+        'messages': messages,
+        'environment': task.environment.stack[0].environment,
+        'runtime': runtime.environment.stack[0].environment,
+    }
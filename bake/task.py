@@ -1,9 +1,12 @@
+import hashlib
+import json
+import marshal
+import os
 from datetime import datetime
 from textwrap import dedent
 from types import FunctionType
 
-from scheme import Field, Format, Structure, Text
-
+from bake.cache import hash_file
 from bake.environment import *
 from bake.exceptions import *
 from bake.util import *
@@ -15,27 +18,40 @@ except ImportError:
 
 __all__ = ('Task', 'TaskError', 'declare', 'parameter', 'requires', 'task')
 
+CACHED = 'cached'
 COMPLETED = 'completed'
 FAILED = 'failed'
 PENDING = 'pending'
 SKIPPED = 'skipped'
+UPTODATE = 'uptodate'
+
+ProcessedConfigurations = BoundedCache(4096)
+
+IMMUTABLE_TYPES = (bool, float, frozenset, int, string, tuple, type(None))
+try:
+    IMMUTABLE_TYPES += (long, unicode)
+except NameError:
+    pass
 
 class Tasks(object):
     by_fullname = {}
     by_name = {}
     by_source = {}
 
+    current_namespace = None
     current_source = None
     declared_environment = None
 
     @classmethod
-    def begin_declaration(cls, source=None):
+    def begin_declaration(cls, source=None, namespace=None):
+        cls.current_namespace = namespace
         cls.current_source = source
         cls.declared_environment = {}
 
     @classmethod
     def declare(cls, declaration, format='yaml'):
         if isinstance(declaration, string):
+            from scheme import Format
             declaration = Format.unserialize(declaration, format)
 
         recursive_merge(cls.declared_environment, declaration)
@@ -43,7 +59,7 @@ class Tasks(object):
     @classmethod
     def end_declaration(cls):
         declaration = cls.declared_environment
-        cls.current_source, cls.declared_environment = None, None
+        cls.current_namespace, cls.current_source, cls.declared_environment = None, None, None
         return declaration
 
     @classmethod
@@ -57,7 +73,7 @@ class Tasks(object):
 
         candidate = cls.by_name.get(name)
         if isinstance(candidate, set):
-            raise MultipleTasksError(candiate)
+            raise MultipleTasksError(candidate)
         elif candidate:
             return candidate
         else:
@@ -82,6 +98,10 @@ class TaskMeta(type):
         if task.name is None:
             return task
 
+        if Tasks.current_namespace and task.namespace != Tasks.current_namespace:
+            task.namespace = Tasks.current_namespace
+            task.name = '%s:%s' % (task.namespace, task.name)
+
         task.configuration = {}
         for name, parameter in parameters.items():
             name = '%s.%s' % (task.name, name)
@@ -129,11 +149,16 @@ class Task(object):
 
     supported = True
 
+    cacheable = False
     configuration = None
     description = None
+    executor = None
     implementation = None
+    inputs = None
     name = None
+    namespace = None
     notes = None
+    outputs = None
     parameters = None
     requires = None
     source = None
@@ -151,6 +176,7 @@ class Task(object):
         self.runtime = runtime
         self.started = None
         self.status = PENDING
+        self.usage = None
         
     def __repr__(self):
         return '%s(name=%r, status=%r)' % (type(self).__name__, self.name, self.status)
@@ -171,32 +197,68 @@ class Task(object):
 
     @property
     def duration(self):
-        return '%.03fs' % (self.finished - self.started).total_seconds()
+        return '%.03fs' % self.elapsed
+
+    @property
+    def elapsed(self):
+        return (self.finished - self.started).total_seconds()
 
     def execute(self, environment):
         """Executes this task and reports the result to the runtime."""
 
         runtime = self.runtime
         try:
-            self.environment = self._prepare_environment(runtime, environment)
+            with runtime.trace('prepare environment', 'task'):
+                self.environment = self._prepare_environment(runtime, environment)
         except RequiredParameterError as exception:
             runtime.error('task requires parameter %r' % exception.args[0])
             self.status = FAILED
             return False
 
-        if runtime.interactive:
+        if self.outputs and not runtime.force and self._check_outputs(runtime):
+            self.status = UPTODATE
+
+        if self.status == PENDING and runtime.interactive:
             if not runtime.check('execute task?', True):
-                self.status = self.SKIPPED
+                self.status = SKIPPED
 
         if self.status == PENDING and runtime.dryrun and not self.supports_dryrun:
             self.status = COMPLETED
 
+        key = None
+        if self.status == PENDING and self.cacheable and self.outputs and not (runtime.force
+                or runtime.dryrun):
+            key = self._compute_cache_key(runtime)
+            messages = runtime.results.restore(key, runtime.curdir)
+            if messages is not None:
+                for message, asis in messages:
+                    runtime._report_message(message, asis)
+                self.status = CACHED
+
         if self.status == PENDING:
-            self._execute_task(runtime)
+            if key:
+                runtime.begin_capture()
+            try:
+                if self.executor == 'process' and runtime.pool:
+                    runtime.pool.execute(self)
+                else:
+                    self._execute_task(runtime)
+            finally:
+                if key:
+                    messages = runtime.end_capture()
+
+            if key and self.status == COMPLETED:
+                outputs = expand_globs(self.outputs, True, runtime.curdir)
+                if outputs:
+                    runtime.results.store(key, outputs, messages, runtime.curdir)
+
+        if self.status == COMPLETED and self.started is not None and self.inputs:
+            self._record_inputs(runtime)
 
         duration = ''
         if self.started is not None and runtime.timing:
-            duration = ' (%s)' % self.duration
+            from bake.usage import format_usage
+            duration = ' (%s%s)' % (self.duration, format_usage(self.usage))
 
         if self.status == COMPLETED:
             runtime.report('[!G]task completed[!]%s' % duration)
@@ -204,6 +266,12 @@ class Task(object):
         elif self.status == SKIPPED:
             runtime.report('[!Y]task skipped[!]')
             return True
+        elif self.status == UPTODATE:
+            runtime.report('[!G]task up to date[!]')
+            return True
+        elif self.status == CACHED:
+            runtime.report('[!G]task restored from cache[!]')
+            return True
         elif runtime.interactive:
             return runtime.check('[!R]task failed[!]%s; continue?' % duration)
         else:
@@ -225,13 +293,107 @@ class Task(object):
     def run(self, runtime):
         raise NotImplementedError()
 
+    @property
+    def stamp(self):
+        return '%s:%s' % (self.fullname, json.dumps(self.params, sort_keys=True, default=str))
+
+    def _compute_cache_key(self, runtime):
+        values = {}
+        for name in (self.configuration or ()):
+            values[name] = self.environment.find(name)
+
+        digest = hashlib.sha1()
+        digest.update(self.fullname.encode('utf8'))
+        digest.update(self._describe_implementation())
+        digest.update(json.dumps(values, sort_keys=True, default=str).encode('utf8'))
+
+        for filename, entry in sorted(self._hash_inputs(runtime).items()):
+            digest.update(('%s:%s' % (filename, entry[2])).encode('utf8'))
+        return digest.hexdigest()
+
+    def _check_outputs(self, runtime):
+        curdir = runtime.curdir
+        outputs = expand_globs(self.outputs, True, curdir)
+        if not outputs:
+            return False
+
+        inputs = expand_globs(self.inputs or (), path=curdir)
+        if not inputs:
+            return True
+
+        oldest = min(os.path.getmtime(os.path.join(curdir, output)) for output in outputs)
+        changed = [filename for filename in inputs
+            if os.path.getmtime(os.path.join(curdir, filename)) > oldest]
+        if not changed:
+            return True
+
+        stamp = runtime.stamps.get(self.stamp)
+        if not stamp or sorted(stamp) != sorted(inputs):
+            return False
+
+        for filename in changed:
+            if hash_file(os.path.join(curdir, filename)) != stamp[filename][2]:
+                return False
+        else:
+            return True
+
+    def _describe_implementation(self):
+        import inspect
+        try:
+            source = inspect.getsource(self.implementation or type(self))
+        except (IOError, OSError, TypeError):
+            pass
+        else:
+            return source.encode('utf8')
+
+        if self.implementation:
+            methods = [self.implementation]
+        else:
+            methods = [self.prepare, self.run, self.finalize]
+        return b''.join(marshal.dumps(method.__code__) for method in methods)
+
+    def _hash_inputs(self, runtime):
+        curdir = runtime.curdir
+        inputs = expand_globs(self.inputs or (), path=curdir)
+        previous = runtime.stamps.get(self.stamp) or {}
+
+        stamp = {}
+        for filename in inputs:
+            path = os.path.join(curdir, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = previous.get(filename)
+            if entry and entry[:2] == [stat.st_mtime, stat.st_size]:
+                stamp[filename] = entry
+            else:
+                stamp[filename] = [stat.st_mtime, stat.st_size, hash_file(path)]
+        return stamp
+
+    def _record_inputs(self, runtime):
+        runtime.stamps.set(self.stamp, self._hash_inputs(runtime))
+
     def _execute_task(self, runtime):
+        measured = None
+        if runtime.timing or runtime.tracer:
+            from bake.usage import measure_usage
+            measured = measure_usage()
+
         self.started = datetime.now()
         try:
-            self.prepare(runtime)
-            call_with_supported_params(self.implementation or self.run,
-                task=self, runtime=runtime, environment=self.environment)
-            self.finalize(runtime)
+            with runtime.trace('prepare', 'task'):
+                self.prepare(runtime)
+            with runtime.trace('run', 'task'):
+                if runtime.profiler:
+                    runtime.profiler.profile(self.fullname, call_with_supported_params,
+                        self.implementation or self.run, task=self, runtime=runtime,
+                        environment=self.environment)
+                else:
+                    call_with_supported_params(self.implementation or self.run,
+                        task=self, runtime=runtime, environment=self.environment)
+            with runtime.trace('finalize', 'task'):
+                self.finalize(runtime)
         except RequiredParameterError as exception:
             runtime.error('task requires parameter %r' % exception.args[0])
             self.status = FAILED
@@ -245,6 +407,9 @@ class Task(object):
             self.status = COMPLETED
         finally:
             self.finished = datetime.now()
+            if measured:
+                from bake.usage import subtract_usage
+                self.usage = subtract_usage(measured, measure_usage())
 
     def _prepare_environment(self, runtime, environment):
         if self.params:
@@ -253,17 +418,39 @@ class Task(object):
         if not self.configuration:
             return environment
 
-        overlay = Environment()
-        for name, parameter in self.configuration.items():
-            value = environment.find(name)
+        values = [(name, environment.find(name)) for name in sorted(self.configuration)]
+        try:
+            key = (type(self), tuple(values), tuple(type(value) for name, value in values))
+            processed = ProcessedConfigurations.get(key)
+        except TypeError:
+            key, processed = None, None
+
+        if processed is None:
+            processed = self._process_configuration(values)
+            if key is not None and all(isinstance(value, IMMUTABLE_TYPES)
+                    for name, value in processed[0]):
+                ProcessedConfigurations.set(key, processed)
+
+        values, missing = processed
+        if missing:
+            raise RequiredParameterError(missing)
+
+        overlay = environment.overlay()
+        for name, value in values:
+            overlay.set(name, value)
+        return overlay
+
+    def _process_configuration(self, values):
+        processed = []
+        for name, value in values:
+            parameter = self.configuration[name]
             if value is not None:
-                overlay.set(name, parameter.process(value, serialized=True))
+                processed.append((name, parameter.process(value, serialized=True)))
             elif parameter.default is not None:
-                overlay.set(name, parameter.default)
+                processed.append((name, parameter.default))
             elif parameter.required:
-                raise RequiredParameterError(name)
-
-        return environment.overlay(overlay)
+                return processed, name
+        return processed, None
 
 def declare(declaration):
     """Declares an envronment."""
@@ -271,6 +458,7 @@ def declare(declaration):
     Tasks.declare(declaration)
 
 def parameter(name, field=None, **params):
+    from scheme import Field, Text
     if isinstance(field, string):
         if 'name' not in params:
             params['name'] = name
@@ -295,12 +483,17 @@ def requires(*args):
         return function
     return decorator
 
-def task(name=None, description=None, supports_dryrun=False, supports_interactive=False):
+def task(name=None, description=None, supports_dryrun=False, supports_interactive=False,
+        executor=None, inputs=None, outputs=None, cacheable=False):
     def decorator(function):
         return type(function.__name__, (Task,), {
             '__doc__': function.__doc__ or '',
+            'cacheable': cacheable,
             'name': name or function.__name__,
             'description': description,
+            'executor': executor,
+            'inputs': inputs,
+            'outputs': outputs,
             'implementation': staticmethod(function),
             'supports_dryrun': supports_dryrun,
             'supports_interactive': supports_interactive,
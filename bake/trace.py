@@ -0,0 +1,97 @@
+"""A timeline of a run of bake in the Chrome trace event format, which can be viewed with
+``chrome://tracing`` or Perfetto.
+
+Each span is recorded as a complete (``X``) event on the lane of the thread which recorded it;
+spans recorded by process workers are shipped back to the runtime and appear under the worker's
+process id.
+"""
+
+import os
+import threading
+from time import time
+
+__all__ = ('NullSpan', 'Tracer')
+
+class _NullSpan(object):
+    """A span which records nothing, used when tracing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def annotate(self, **args):
+        pass
+
+NullSpan = _NullSpan()
+
+class Span(object):
+    def __init__(self, tracer, name, category, args):
+        self.args = args
+        self.category = category
+        self.name = name
+        self.started = None
+        self.tracer = tracer
+
+    def __enter__(self):
+        self.started = time()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        finished = time()
+        if exception_type is not None:
+            self.args['exception'] = repr(exception)
+        self.tracer.record(self.name, self.category, self.started, finished, self.args)
+
+    def annotate(self, **args):
+        """Adds ``args`` to those recorded with this span."""
+        self.args.update(args)
+
+class Tracer(object):
+    """Records spans for writing to ``path``."""
+
+    def __init__(self, path=None):
+        self.events = []
+        self.path = path
+        self.threads = {}
+
+    def extend(self, events):
+        """Adds ``events`` recorded by another tracer, such as that of a process worker."""
+        self.events.extend(events)
+
+    def record(self, name, category, started, finished, args=None):
+        thread = threading.current_thread()
+        tid = thread.ident
+        if tid not in self.threads:
+            self.threads[tid] = thread.name
+
+        event = {'name': name, 'cat': category, 'ph': 'X', 'ts': int(started * 1e6),
+            'dur': int((finished - started) * 1e6), 'pid': os.getpid(), 'tid': tid}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def span(self, name, category='bake', **args):
+        """Returns a context manager which records a span around its block."""
+        return Span(self, name, category, args)
+
+    def write(self, path=None):
+        import json
+
+        pid = os.getpid()
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'bake'}}]
+        for tid, name in sorted(self.threads.items()):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                'args': {'name': name}})
+
+        for process in sorted(set(event['pid'] for event in self.events) - set([pid])):
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': process,
+                'args': {'name': 'worker %d' % process}})
+
+        openfile = open(path or self.path, 'w')
+        try:
+            json.dump({'traceEvents': events + self.events, 'displayTimeUnit': 'ms'}, openfile,
+                default=str)
+        finally:
+            openfile.close()
@@ -0,0 +1,106 @@
+"""Measurement of the resources consumed by the execution of a task.
+
+CPU time is measured for the calling thread, where the platform can, so that tasks executing
+concurrently on other threads are not included; CPU time of child processes can only be
+measured for the process as a whole, so includes that of children of concurrent tasks. The
+peak resident set sizes are high-water marks for this process and its largest child process,
+rather than deltas; a child launched by ``vfork`` or ``posix_spawn`` is charged with the size of
+this process until it executes. I/O is measured from ``/proc``, where available.
+"""
+
+import os
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__all__ = ('format_usage', 'measure_usage', 'subtract_usage')
+
+IO_FIELDS = ('rchar', 'wchar', 'read_bytes', 'write_bytes')
+
+MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+if resource:
+    RUSAGE_SELF = getattr(resource, 'RUSAGE_THREAD', resource.RUSAGE_SELF)
+
+if os.path.exists('/proc/thread-self/io'):
+    IO_PATH = '/proc/thread-self/io'
+elif os.path.exists('/proc/self/io'):
+    IO_PATH = '/proc/self/io'
+else:
+    IO_PATH = None
+
+def format_usage(usage):
+    """Formats ``usage`` for the timing report."""
+
+    if not usage:
+        return ''
+
+    text = ', cpu %.03fs' % (usage['user'] + usage['system'])
+    children = usage['children_user'] + usage['children_system']
+    if children:
+        text += ' + %.03fs children' % children
+
+    text += ', rss %s' % format_size(usage['maxrss'])
+    if usage['children_maxrss']:
+        text += ' (children %s)' % format_size(usage['children_maxrss'])
+
+    if 'read_bytes' in usage:
+        text += ', io %s read, %s written' % (format_size(usage['read_bytes']),
+            format_size(usage['write_bytes']))
+    return text
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return '%d%s' % (size, unit)
+        size /= 1024.0
+    return '%.1fGB' % size
+
+def measure_usage():
+    """Returns the resources consumed so far, as a ``dict``, or ``None`` if resources cannot
+    be measured on this platform."""
+
+    if not resource:
+        return None
+
+    usage = resource.getrusage(RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    measured = {
+        'user': usage.ru_utime,
+        'system': usage.ru_stime,
+        'maxrss': usage.ru_maxrss * MAXRSS_UNIT,
+        'children_user': children.ru_utime,
+        'children_system': children.ru_stime,
+        'children_maxrss': children.ru_maxrss * MAXRSS_UNIT,
+    }
+
+    if IO_PATH:
+        try:
+            openfile = open(IO_PATH)
+            try:
+                for line in openfile:
+                    name, value = line.split(':', 1)
+                    if name in IO_FIELDS:
+                        measured[name] = int(value)
+            finally:
+                openfile.close()
+        except (IOError, OSError, ValueError):
+            pass
+    return measured
+
+def subtract_usage(started, finished):
+    """Returns the resources consumed between the measurements ``started`` and ``finished``."""
+
+    if not (started and finished):
+        return None
+
+    usage = {}
+    for name, value in finished.items():
+        if name in ('maxrss', 'children_maxrss'):
+            usage[name] = value
+        elif name in started:
+            usage[name] = value - started[name]
+    return usage
@@ -1,29 +1,150 @@
+import hashlib
+import marshal
 import os
+import struct
 import sys
-from inspect import getargspec
-from tempfile import mkstemp
+from collections import deque
+from glob import glob
 from textwrap import dedent
-from traceback import format_tb
 
-from scheme import StructuredText
+from bake.exceptions import TaskError
 
-__all__ = ('call_with_supported_params', 'enumerate_packages', 'execute_python_shell',
-    'get_package_data', 'get_package_path', 'import_object', 'import_source',
-    'parse_argument_pair', 'propagate_traceback', 'recursive_merge', 'string',
-    'topological_sort', 'with_metaclass')
+__all__ = ('BoundedCache', 'bounded_cache', 'call_with_supported_params', 'compile_source',
+    'enumerate_packages', 'execute_python_shell', 'expand_globs', 'get_package_data',
+    'get_package_path', 'import_object', 'import_source', 'parse_argument_pair',
+    'propagate_traceback', 'recursive_merge', 'string', 'topological_sort', 'with_metaclass')
 
 try:
     string = basestring
 except NameError:
     string = str
 
+try:
+    from collections import OrderedDict
+except ImportError:
+    OrderedDict = None
+
+try:
+    from glob import escape as escape_glob
+except ImportError:
+    escape_glob = lambda path: path
+
+class BoundedCache(object):
+    """A thread-safe cache of at most ``capacity`` entries which discards the least recently
+    used; without ``OrderedDict``, the cache is instead emptied whenever it fills."""
+
+    def __init__(self, capacity=1024):
+        from threading import Lock
+        self.capacity = capacity
+        self.entries = OrderedDict() if OrderedDict else {}
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.entries.pop(key)
+            except KeyError:
+                return default
+            self.entries[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            entries = self.entries
+            entries.pop(key, None)
+            if len(entries) >= self.capacity:
+                if OrderedDict:
+                    entries.popitem(False)
+                else:
+                    entries.clear()
+            entries[key] = value
+
+def bounded_cache(maxsize=1024):
+    """Decorates a function of hashable arguments with a cache of at most ``maxsize`` of its
+    results, discarding the least recently used; the cache is ``functools.lru_cache`` where
+    available, and a :class:`BoundedCache` otherwise."""
+
+    try:
+        from functools import lru_cache
+    except ImportError:
+        pass
+    else:
+        return lru_cache(maxsize)
+
+    def decorator(function):
+        cache, missing = BoundedCache(maxsize), object()
+        def wrapper(*args):
+            value = cache.get(args, missing)
+            if value is missing:
+                value = function(*args)
+                cache.set(args, value)
+            return value
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+@bounded_cache(1024)
+def get_argument_names(function):
+    from inspect import getargspec
+    return frozenset(getargspec(function)[0])
+
 def call_with_supported_params(callable, **params):
-    arguments = getargspec(callable)[0]
+    arguments = get_argument_names(getattr(callable, '__func__', callable))
     for key in list(params):
         if key not in arguments:
             del params[key]
     return callable(**params)
 
+def compile_source(path):
+    """Compiles the python source file at ``path`` to a code object, caching the marshalled
+    code object in the bake cache directory. As with ``__pycache__``, the cached code is reused
+    only while the size and modification time of the source and the interpreter's magic number
+    are unchanged."""
+
+    from bake.cache import get_cache_path, write_atomically
+
+    stat = os.stat(path)
+    mtime = getattr(stat, 'st_mtime_ns', None) or int(stat.st_mtime * 1e9)
+    header = get_magic_number() + struct.pack('<QQ', mtime, stat.st_size)
+
+    abspath = os.path.abspath(path)
+    key = hashlib.sha1(abspath.encode('utf8')).hexdigest()
+    cachepath = get_cache_path('bytecode', key[:2], key[2:])
+
+    try:
+        openfile = open(cachepath, 'rb')
+        try:
+            data = openfile.read()
+        finally:
+            openfile.close()
+    except (IOError, OSError):
+        pass
+    else:
+        if data[:len(header)] == header:
+            try:
+                return marshal.loads(data[len(header):])
+            except (EOFError, ValueError, TypeError):
+                pass
+
+    openfile = open(path, 'r')
+    try:
+        code = compile(openfile.read(), abspath, 'exec')
+    finally:
+        openfile.close()
+
+    try:
+        write_atomically(cachepath, header + marshal.dumps(code))
+    except (IOError, OSError):
+        pass
+    return code
+
 def enumerate_packages(rootpath):
     packages = []
     for root, dirs, files in os.walk(rootpath):
@@ -42,6 +163,7 @@ def execute_python_shell(code=None, ipython=False):
             arguments = ['ipython', '-i']
 
     if code:
+        from tempfile import mkstemp
         fileno, filename = mkstemp('.py', 'bake')
         os.write(fileno, dedent(code))
         os.close(fileno)
@@ -49,6 +171,37 @@ def execute_python_shell(code=None, ipython=False):
 
     os.execvp(arguments[0], arguments)
 
+def expand_globs(patterns, strict=False, path=None):
+    """Expands ``patterns`` into a list of matching files, disregarding directories. If
+    ``path`` is specified, relative patterns are matched under it and their matches are returned
+    relative to it."""
+
+    prefix = os.path.join(path, '') if path else ''
+    files = []
+    for pattern in patterns:
+        offset = 0
+        if prefix and not os.path.isabs(pattern):
+            pattern, offset = escape_glob(prefix) + pattern, len(prefix)
+        try:
+            matches = glob(pattern, recursive=True)
+        except TypeError:
+            matches = glob(pattern)
+        matches = [match for match in matches if os.path.isfile(match)]
+        if matches:
+            files.extend(sorted(match[offset:] for match in matches))
+        elif strict:
+            return None
+    return files
+
+def get_magic_number():
+    try:
+        from importlib.util import MAGIC_NUMBER
+    except ImportError:
+        from imp import get_magic
+        return get_magic()
+    else:
+        return MAGIC_NUMBER
+
 def get_package_data(module, path):
     openfile = open(get_package_path(module, path))
     try:
@@ -91,19 +244,16 @@ def import_object(path):
 
 def import_source(path):
     namespace = {}
-
-    openfile = open(path, 'r')
-    try:
-        exec(openfile.read(), namespace)
-        return namespace
-    finally:
-        openfile.close()
+    exec(compile_source(path), namespace)
+    return namespace
 
 def parse_argument_pair(pair):
+    from scheme import StructuredText
     path, value = pair.split('=', 1)
     return path, StructuredText.unserialize(value, True)
 
 def propagate_traceback(exception):
+    from traceback import format_tb
     traceback = sys.exc_info()[2]
     if traceback is not None:
         traceback = ''.join(format_tb(traceback))
@@ -125,30 +275,54 @@ def recursive_merge(original, addition):
     return original
 
 def topological_sort(graph):
-    queue = []
-    edges = graph.values()
-    for node in list(graph):
-        for edge in edges:
-            if node in edge:
-                break
-        else:
-            queue.append(node)
+    """Sorts ``graph``, a dict mapping each node to the set of nodes it depends upon, such that
+    every node follows its dependencies, in O(V+E). Raises ``TaskError`` describing the cycle
+    when the graph contains one."""
 
+    indegrees = dict.fromkeys(graph, 0)
+    for edges in graph.values():
+        for target in edges:
+            indegrees[target] = indegrees.get(target, 0) + 1
+
+    queue = deque(node for node in graph if not indegrees[node])
     result = []
+
     while queue:
-        node = queue.pop(0)
+        node = queue.popleft()
         result.append(node)
-        for target in graph[node].copy():
-            graph[node].remove(target)
-            for edge in graph.values():
-                if target in edge:
-                    break
-            else:
+        for target in graph.get(node, ()):
+            indegrees[target] -= 1
+            if not indegrees[target]:
                 queue.append(target)
 
+    if len(result) < len(indegrees):
+        cycle = _find_cycle(graph, indegrees)
+        names = [str(getattr(node, 'name', node)) for node in cycle]
+        raise TaskError('circular dependency: %s' % ' -> '.join(names))
+
     result.reverse()
     return result
 
+def _find_cycle(graph, indegrees):
+    predecessors = {}
+    for node, edges in graph.items():
+        if indegrees[node]:
+            for target in edges:
+                predecessors.setdefault(target, node)
+
+    node = next(node for node in graph if indegrees[node])
+    visited = {}
+    path = []
+    while node not in visited:
+        visited[node] = len(path)
+        path.append(node)
+        node = predecessors[node]
+
+    cycle = path[visited[node]:]
+    cycle.reverse()
+    cycle.append(cycle[0])
+    return cycle
+
 def with_metaclass(metaclass):
     def decorator(cls):
         namespace = cls.__dict__.copy()
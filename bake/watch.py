@@ -0,0 +1,192 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+from time import sleep, time
+
+from bake.discovery import IGNORED_DIRECTORIES
+
+__all__ = ('InotifyWatcher', 'PollingWatcher', 'create_watcher')
+
+IGNORED_SUFFIXES = ('.pyc', '.pyo', '.swp', '.swx', '~')
+
+def is_ignored(name):
+    return (name.startswith('.#') or name.endswith(IGNORED_SUFFIXES))
+
+class Watcher(object):
+    """Watches the tree under ``root`` for changes to files.
+
+    :meth:`wait` blocks until at least one change occurs, then continues to collect changes
+    until none have occurred for ``debounce`` seconds, so that a burst of events (a checkout,
+    an editor saving several files) results in a single set of changed paths.
+    """
+
+    def __init__(self, root, debounce=0.2):
+        self.debounce = debounce
+        self.root = os.path.abspath(root)
+
+    def close(self):
+        pass
+
+    def discard(self):
+        """Discards the changes which have occurred since the last collection."""
+        self.collect(0)
+
+    def collect(self, timeout):
+        raise NotImplementedError()
+
+    def wait(self):
+        changes = set()
+        while not changes:
+            changes.update(self.collect(None))
+
+        while True:
+            additional = self.collect(self.debounce)
+            if not additional:
+                return changes
+            changes.update(additional)
+
+    def _walk(self):
+        for root, dirs, files in os.walk(self.root):
+            dirs[:] = [name for name in dirs if name not in IGNORED_DIRECTORIES]
+            yield root, files
+
+class InotifyWatcher(Watcher):
+    """A watcher using the Linux inotify API through ctypes."""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0x00000800
+    IN_CLOEXEC = 0x00080000
+
+    MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        | IN_DELETE_SELF | IN_MODIFY)
+
+    header = struct.Struct('iIII')
+
+    def __init__(self, root, debounce=0.2):
+        Watcher.__init__(self, root, debounce)
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        self.directories = {}
+        for root, files in self._walk():
+            self._watch(root)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def collect(self, timeout):
+        changes = set()
+        readable = select.select([self.fd], [], [], timeout)[0]
+        if not readable:
+            return changes
+
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError as exception:
+                if exception.errno == errno.EAGAIN:
+                    return changes
+                raise
+            if not data:
+                return changes
+            self._parse_events(data, changes)
+
+    def _parse_events(self, data, changes):
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self.header.unpack_from(data, offset)
+            offset += self.header.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf8', 'replace')
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                changes.add(self.root)
+                continue
+
+            directory = self.directories.get(wd)
+            if directory is None:
+                continue
+            if mask & self.IN_IGNORED:
+                del self.directories[wd]
+                continue
+
+            if mask & self.IN_ISDIR:
+                if name in IGNORED_DIRECTORIES:
+                    continue
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self._watch(os.path.join(directory, name))
+            elif name and is_ignored(name):
+                continue
+
+            changes.add(os.path.join(directory, name) if name else directory)
+
+    def _watch(self, directory):
+        wd = self._add_watch(self.fd, directory.encode('utf8'), self.MASK)
+        if wd >= 0:
+            self.directories[wd] = directory
+
+class PollingWatcher(Watcher):
+    """A watcher which periodically scans the tree, for platforms without inotify."""
+
+    def __init__(self, root, debounce=0.2, interval=0.5):
+        Watcher.__init__(self, root, debounce)
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def collect(self, timeout):
+        started = time()
+        while True:
+            snapshot = self._scan()
+            changes = set()
+            for filename, signature in snapshot.items():
+                if self.snapshot.get(filename) != signature:
+                    changes.add(filename)
+            changes.update(set(self.snapshot) - set(snapshot))
+
+            self.snapshot = snapshot
+            if changes:
+                return changes
+
+            if timeout is not None and time() - started >= timeout:
+                return changes
+            sleep(self.interval if timeout is None else min(self.interval, timeout))
+
+    def _scan(self):
+        snapshot = {}
+        for root, files in self._walk():
+            for name in files:
+                if is_ignored(name):
+                    continue
+                filename = os.path.join(root, name)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+                snapshot[filename] = (stat.st_mtime, stat.st_size)
+        return snapshot
+
+def create_watcher(root, debounce=0.2):
+    try:
+        return InotifyWatcher(root, debounce)
+    except (AttributeError, OSError):
+        return PollingWatcher(root, debounce)
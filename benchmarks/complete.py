@@ -0,0 +1,96 @@
+"""Measures the latency of ``bake --complete`` for a generated project.
+
+The project declares the specified number of tasks, each with parameters, in a single bakefile.
+The first invocation populates the task manifest; subsequent invocations are timed end to end,
+including interpreter startup. The startup of a bare interpreter and the import of the ``bake``
+package, which every invocation pays, are timed the same way and reported alongside, as they
+bound how fast completion can be on the host. If ``--target`` is specified, in milliseconds, the
+check fails if the median of any scenario exceeds it. A temporary cache directory is used so the
+user's cache is left untouched.
+
+    $ python benchmarks/complete.py [--tasks N] [--repeat N] [--target MS]
+"""
+
+import optparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TASK = '''
+@task(description='task number %(i)d')
+@parameter('level', field='integer', description='a level')
+@parameter('target', description='a target')
+def task_%(i)d(runtime):
+    pass
+'''
+
+def generate(directory, count):
+    lines = ['from bake import *']
+    for i in range(count):
+        lines.append(TASK % {'i': i})
+
+    openfile = open(os.path.join(directory, 'Bakefile'), 'w')
+    try:
+        openfile.write('\n'.join(lines))
+    finally:
+        openfile.close()
+
+def measure(directory, environ, words=None, code=None):
+    if code is not None:
+        command = [sys.executable, '-c', code]
+    else:
+        command = [sys.executable, os.path.join(ROOT, 'bin', 'bake'), '--complete'] + words
+    started = time()
+    process = subprocess.Popen(command, cwd=directory, env=environ, stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, universal_newlines=True)
+    stdout, stderr = process.communicate()
+    return (time() - started) * 1000, stdout.splitlines()
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--repeat', type='int', default=10)
+    parser.add_option('--target', type='float')
+    parser.add_option('--tasks', type='int', default=2000)
+    options = parser.parse_args()[0]
+
+    directory = tempfile.mkdtemp()
+    try:
+        project = os.path.join(directory, 'project')
+        os.mkdir(project)
+        generate(project, options.tasks)
+
+        environ = dict(os.environ)
+        environ['BAKE_NODAEMON'] = '1'
+        environ['XDG_CACHE_HOME'] = os.path.join(directory, 'cache')
+        environ.pop('PYTHONDONTWRITEBYTECODE', None)
+        environ['PYTHONPATH'] = os.pathsep.join([ROOT] + [path for path in
+            environ.get('PYTHONPATH', '').split(os.pathsep) if path])
+
+        elapsed, candidates = measure(project, environ, ['task_1'])
+        print('cold: %.1fms, %d candidates' % (elapsed, len(candidates)))
+
+        failed = False
+        scenarios = [('interpreter', None, 'pass'), ('import bake', None, 'import bake.daemon')]
+        for words in (['task_1'], ['task_1', ''], ['-']):
+            scenarios.append((' '.join(repr(word) for word in words), words, None))
+
+        for label, words, code in scenarios:
+            timings = sorted(measure(project, environ, words, code)[0]
+                for i in range(options.repeat))
+            median = timings[len(timings) // 2]
+            print('%-16s min %.1fms  median %.1fms' % (label, timings[0], median))
+            if code is None and options.target and median > options.target:
+                failed = True
+    finally:
+        shutil.rmtree(directory)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Measures the per-task overhead of dispatching trivial tasks through ``Runtime.execute``.
+
+A single task declaring several parameters is executed the specified number of times with the
+same inputs, as happens when many tasks of one kind run with a shared environment, so that all
+but the first preparation of its environment is answered from the processed-configuration
+cache. With ``--nocache``, the cache is cleared before each execution for comparison.
+
+    $ python benchmarks/dispatch.py [--tasks N] [--nocache]
+"""
+
+import optparse
+import os
+import sys
+from time import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bake.runtime import Runtime
+from bake.task import ProcessedConfigurations, parameter, task
+
+@task()
+@parameter('level', field='integer', default=1)
+@parameter('name', 'text', required=True)
+@parameter('target', field='token')
+@parameter('verbose', field='boolean', default=False)
+def trivial(runtime):
+    pass
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--nocache', action='store_true', default=False)
+    parser.add_option('--tasks', type='int', default=10000)
+    options = parser.parse_args()[0]
+
+    runtime = Runtime(stream=open(os.devnull, 'w'), quiet=True)
+    runtime.path = os.getcwd()
+    runtime.environment.set('trivial.name', 'value')
+    runtime.environment.set('trivial.level', '3')
+
+    started = time()
+    for i in range(options.tasks):
+        if options.nocache:
+            ProcessedConfigurations.clear()
+        runtime.execute(trivial(runtime), runtime.environment)
+    elapsed = time() - started
+
+    print('%d tasks in %.3fs, %.1fus per task' % (options.tasks, elapsed,
+        elapsed / options.tasks * 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Times ``find``, ``get`` and ``has`` on environment stacks of increasing depth, using dotted
+keys of increasing length, in the manner of ``Task._prepare_environment``: most keys are
+resolved by the bottom layer, through the fallback to shorter keys. The last column times a
+``set`` on the top layer followed by a ``find``, which invalidates memoized lookups.
+
+    $ python benchmarks/environment.py [--number N]
+"""
+
+import optparse
+import os
+import sys
+from timeit import Timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bake.environment import Environment
+
+def build(depth, length):
+    tokens = ['t%d' % i for i in range(length)]
+    base = Environment()
+    base.set('.'.join(tokens), 1)
+    base.set('value', 2)
+
+    environment = base
+    for i in range(depth - 1):
+        environment = environment.overlay({'layer%d' % i: {'value': i}})
+    return environment, '.'.join(tokens), '.'.join(tokens[:-1] + ['value'])
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--number', type='int', default=20000)
+    options = parser.parse_args()[0]
+
+    print('%6s %7s %12s %12s %12s %12s' % ('depth', 'length', 'get', 'find', 'has', 'set+find'))
+    for depth in (1, 4, 16):
+        for length in (2, 8, 16):
+            environment, path, fallback = build(depth, length)
+            timings = []
+            for statement in (lambda: environment.get(path),
+                    lambda: environment.find(fallback), lambda: environment.has(path),
+                    lambda: environment.set('top', 1).find(fallback)):
+                elapsed = min(Timer(statement).repeat(3, options.number))
+                timings.append('%9.2fus' % (elapsed / options.number * 1e6))
+            print('%6d %7d %s' % (depth, length, ' '.join('%12s' % t for t in timings)))
+
+if __name__ == '__main__':
+    main()
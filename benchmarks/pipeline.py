@@ -0,0 +1,49 @@
+"""Compares moving data through a chain of commands with a pipeline against relaying each
+command's output through this process as the input of the next.
+
+The chain generates the specified number of megabytes, compresses them and checksums the
+result, as a packaging task might.
+
+    $ python benchmarks/pipeline.py [--size MB]
+"""
+
+import optparse
+import os
+import sys
+from time import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bake.process import Pipeline, Process
+
+def relay(commands):
+    data = None
+    for command in commands:
+        process = Process(command, capture=True)
+        process(data)
+        data = process.stdout.getvalue()
+        process.stdout.close()
+    return data
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--size', type='int', default=256)
+    options = parser.parse_args()[0]
+
+    commands = [['head', '-c', str(options.size * 1048576), '/dev/zero'], ['gzip', '-1'],
+        ['sha1sum']]
+
+    started = time()
+    relayed = relay(commands)
+    print('relayed   %.3fs' % (time() - started))
+
+    started = time()
+    pipeline = Pipeline(commands, binary=True)
+    pipeline.run()
+    print('pipeline  %.3fs' % (time() - started))
+
+    if pipeline.stdout != relayed:
+        sys.exit('outputs differ')
+
+if __name__ == '__main__':
+    main()
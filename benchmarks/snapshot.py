@@ -0,0 +1,65 @@
+"""Compares the cost of forking an environment for many tasks with a mutable and a persistent
+backing store.
+
+Each task overlays its parameters on a shared runtime environment of the specified size, sets a
+value of its own and takes a snapshot, as the process executor does; the snapshots are retained,
+as they would be by in-flight tasks. Reports the time taken and, on Python 3, the memory
+allocated for all of them.
+
+    $ python benchmarks/snapshot.py [--keys N] [--tasks N]
+"""
+
+import optparse
+import os
+import sys
+from time import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bake.environment import Environment, PersistentEnvironment
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+def build(keys):
+    environment = {}
+    for i in range(keys):
+        environment.setdefault('group%d' % (i % 100), {})['key%d' % i] = {'value': i}
+    return environment
+
+def fork(implementation, base, tasks):
+    runtime = implementation(base)
+    snapshots = []
+    for i in range(tasks):
+        environment = runtime.overlay({'task%d' % i: {'param': i}})
+        environment.set('group%d.key%d.result' % (i % 100, i), i)
+        snapshots.append(environment.snapshot())
+    return snapshots
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--keys', type='int', default=10000)
+    parser.add_option('--tasks', type='int', default=200)
+    options = parser.parse_args()[0]
+
+    base = build(options.keys)
+    for implementation in (Environment, PersistentEnvironment):
+        if tracemalloc:
+            tracemalloc.start()
+        started = time()
+        snapshots = fork(implementation, base, options.tasks)
+        elapsed = time() - started
+
+        memory = ''
+        if tracemalloc:
+            memory = ', %.1fMB allocated' % (tracemalloc.get_traced_memory()[0] / 1048576.0)
+            tracemalloc.stop()
+
+        print('%-22s %d tasks in %.3fs%s' % (implementation.__name__, len(snapshots),
+            elapsed, memory))
+        del snapshots
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Compares launching child processes with ``posix_spawnp`` and with ``subprocess`` from a
+runtime with a large heap.
+
+The specified number of megabytes is allocated and written to, as a runtime holding large
+environments would, and the specified number of short-lived processes are then run through
+``run_processes`` with each launch path.
+
+    $ python benchmarks/spawn.py [--heap MB] [--processes N] [--concurrency N]
+"""
+
+import optparse
+import os
+import resource
+import sys
+from time import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bake.process
+from bake.process import Process, run_processes
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--concurrency', type='int', default=32)
+    parser.add_option('--heap', type='int', default=1024)
+    parser.add_option('--processes', type='int', default=5000)
+    options = parser.parse_args()[0]
+
+    if not bake.process.SPAWN:
+        sys.exit('posix_spawnp is not used on this platform')
+
+    heap = [b'\x01' * 1048576 for i in range(options.heap)]
+    print('heap: %dMB, maximum rss: %dMB' % (len(heap),
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024))
+
+    for spawn in (True, False):
+        bake.process.SPAWN = spawn
+        processes = [Process(['true']) for i in range(options.processes)]
+
+        started = time()
+        run_processes(processes, options.concurrency)
+        elapsed = time() - started
+
+        print('%-12s %d processes in %.3fs, %.0fus per process' % (
+            'posix_spawnp' if spawn else 'subprocess', len(processes), elapsed,
+            elapsed / len(processes) * 1e6))
+
+if __name__ == '__main__':
+    main()
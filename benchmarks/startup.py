@@ -0,0 +1,80 @@
+"""Checks the import-time budget of the ``bake`` entry points.
+
+Each scenario runs a fresh interpreter under ``python -X importtime`` and reports the modules
+which took longest to import. The check fails if a scenario imports any module it should not
+need, or if its cumulative import time exceeds the budget, in milliseconds.
+
+    $ python benchmarks/startup.py [--budget MS] [--repeat N] [--top N]
+"""
+
+import optparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FORBIDDEN = ('bake.lib', 'bake.path', 'bake.process', 'bake.scheduler', 'bake.watch',
+    'colorama', 'ctypes', 'multiprocessing', 'scheme', 'subprocess', 'urllib.request', 'yaml')
+
+SCENARIOS = (
+    ('bake --version', "import sys; sys.argv = ['bake', '--version']\n"
+        "from bake.runtime import run; run()", FORBIDDEN),
+    ('daemon client', 'import bake.daemon', FORBIDDEN + ('bake.runtime', 'optparse')),
+)
+
+ImportLine = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+def measure(code):
+    environ = dict(os.environ)
+    environ.pop('PYTHONDONTWRITEBYTECODE', None)
+    environ['PYTHONPATH'] = os.pathsep.join([ROOT] + [path for path in
+        environ.get('PYTHONPATH', '').split(os.pathsep) if path])
+
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=environ, universal_newlines=True)
+    stdout, stderr = process.communicate()
+
+    modules = {}
+    total = 0
+    for line in stderr.splitlines():
+        match = ImportLine.match(line)
+        if not match:
+            continue
+
+        cumulative, indent, module = int(match.group(2)), len(match.group(3)), match.group(4)
+        modules[module] = cumulative
+        if indent == 1 and not module.startswith(('encodings', 'site', 'zipimport', 'codecs')):
+            total += cumulative
+    return total, modules
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--budget', type='float', default=60.0)
+    parser.add_option('--repeat', type='int', default=5)
+    parser.add_option('--top', type='int', default=8)
+    options = parser.parse_args()[0]
+
+    failed = False
+    for name, code, forbidden in SCENARIOS:
+        runs = [measure(code) for i in range(options.repeat + 1)][1:]
+        total, modules = min(runs, key=lambda run: run[0])
+
+        print('%s: %.1fms (budget %.1fms)' % (name, total / 1000.0, options.budget))
+        for module, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:options.top]:
+            print('  %8.1fms  %s' % (cumulative / 1000.0, module))
+
+        imported = sorted(module for module in modules if module in forbidden)
+        if imported:
+            print('  imports modules it does not need: %s' % ', '.join(imported))
+            failed = True
+        if total / 1000.0 > options.budget:
+            print('  exceeds import-time budget')
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
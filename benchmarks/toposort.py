@@ -0,0 +1,46 @@
+"""Benchmarks ``bake.util.topological_sort`` over synthetic task graphs.
+
+Each graph is a layered DAG in which every node depends upon a few randomly chosen nodes from
+earlier layers, approximating a generated bakefile of fine-grained tasks.
+
+    $ python benchmarks/toposort.py [NODES ...]
+"""
+
+import os
+import random
+import sys
+from time import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bake.util import topological_sort
+
+def generate_graph(nodes, width=100, fanout=3, seed=0):
+    generator = random.Random(seed)
+    graph = {}
+    for node in range(nodes):
+        floor = node - (node % width)
+        if floor:
+            targets = generator.sample(range(max(0, floor - width * 4), floor), min(fanout, floor))
+            graph[node] = set(targets)
+        else:
+            graph[node] = set()
+    return graph
+
+def benchmark(nodes, repeat=3):
+    graph = generate_graph(nodes)
+    edges = sum(len(targets) for targets in graph.values())
+
+    best = None
+    for i in range(repeat):
+        started = time()
+        topological_sort(graph)
+        elapsed = time() - started
+        if best is None or elapsed < best:
+            best = elapsed
+
+    print('%8d nodes %8d edges %10.2fms' % (nodes, edges, best * 1000))
+
+if __name__ == '__main__':
+    for nodes in [int(argument) for argument in sys.argv[1:]] or [1000, 10000, 100000]:
+        benchmark(nodes)
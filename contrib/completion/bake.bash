@@ -0,0 +1,26 @@
+# Bash completion for bake. Source this file from ~/.bashrc, or install it as "bake" within
+# the bash-completion directory.
+
+_bake()
+{
+    local cur words cword
+    if declare -F _get_comp_words_by_ref >/dev/null; then
+        _get_comp_words_by_ref -n =: cur words cword
+    else
+        cur="${COMP_WORDS[COMP_CWORD]}"
+        words=("${COMP_WORDS[@]}")
+        cword=$COMP_CWORD
+    fi
+
+    local IFS=$'\n'
+    COMPREPLY=($("${words[0]}" --complete "${words[@]:1:cword-1}" "$cur" 2>/dev/null))
+
+    if declare -F __ltrim_colon_completions >/dev/null; then
+        __ltrim_colon_completions "$cur"
+    fi
+    if [[ ${#COMPREPLY[@]} -eq 1 && ${COMPREPLY[0]} == *[=:] ]]; then
+        compopt -o nospace 2>/dev/null
+    fi
+}
+
+complete -F _bake bake
@@ -17,7 +17,7 @@ setup(
     packages=find_packages(exclude=['docs', 'tests']),
     entry_points={
         'console_scripts': [
-            'bake = bake.runtime:run',
+            'bake = bake.daemon:forward',
         ],
     },
     classifiers=[
@@ -0,0 +1,65 @@
+"""A project in a temporary directory, on which tests invoke bake in a separate process, so that
+the tasks each project loads and the state it persists remain isolated from other tests."""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from textwrap import dedent
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class Project(object):
+    def __init__(self, files=None):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'project')
+        os.mkdir(self.path)
+
+        self.environ = dict(os.environ, XDG_CACHE_HOME=os.path.join(self.root, 'cache'),
+            XDG_CONFIG_HOME=os.path.join(self.root, 'config'), BAKEOPTS='--nosearch')
+        pythonpath = self.environ.get('PYTHONPATH')
+        self.environ['PYTHONPATH'] = os.pathsep.join([ROOT, pythonpath] if pythonpath
+            else [ROOT])
+
+        for name, content in (files or {}).items():
+            self.write(name, content)
+
+    def close(self):
+        shutil.rmtree(self.root)
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.path, name))
+
+    def invoke(self, *arguments, **params):
+        """Invokes bake with ``arguments`` in the project, or in its subdirectory ``cwd``,
+        returning its exit code and output."""
+
+        cwd = os.path.join(self.path, params.get('cwd', ''))
+        process = subprocess.Popen([sys.executable, '-c', 'from bake.runtime import run; run()']
+            + list(arguments), cwd=cwd, env=self.environ, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT)
+        output = process.communicate()[0].decode('utf8')
+        return process.returncode, output
+
+    def read(self, name):
+        with open(os.path.join(self.path, name)) as openfile:
+            return openfile.read()
+
+    def remove(self, name):
+        os.unlink(os.path.join(self.path, name))
+
+    def touch(self, name, offset):
+        """Moves the modification time of ``name`` by ``offset`` seconds."""
+
+        filename = os.path.join(self.path, name)
+        mtime = os.path.getmtime(filename) + offset
+        os.utime(filename, (mtime, mtime))
+
+    def write(self, name, content):
+        filename = os.path.join(self.path, name)
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(filename, 'w') as openfile:
+            openfile.write(dedent(content))
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from bake.cache import *
+
+from project import Project
+
+BAKEFILE = """
+    from bake import *
+
+    @task(inputs=['input.txt'], outputs=['output.txt'], cacheable=True)
+    @parameter('suffix')
+    def build(task, runtime):
+        runtime.report('building %s' % task['suffix'])
+        with open('input.txt') as openfile:
+            content = openfile.read()
+        with open('output.txt', 'w') as openfile:
+            openfile.write(content + task['suffix'])
+"""
+
+class TestResultCache(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.root, 'cache'))
+        self.path = os.path.join(self.root, 'project')
+        os.makedirs(os.path.join(self.path, 'build'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_restore(self):
+        output = os.path.join(self.path, 'build', 'output.txt')
+        with open(output, 'w') as openfile:
+            openfile.write('output')
+        os.chmod(output, 0o640)
+
+        self.cache.store('abcdef', ['build/output.txt'], [['message', False]], self.path)
+        shutil.rmtree(os.path.join(self.path, 'build'))
+
+        self.assertEqual(self.cache.restore('abcdef', self.path), [['message', False]])
+        with open(output) as openfile:
+            self.assertEqual(openfile.read(), 'output')
+        self.assertEqual(os.stat(output).st_mode & 0o7777, 0o640)
+        self.assertEqual(os.stat(output).st_nlink, 1)
+
+        os.chmod(output, 0o644)
+        with open(output, 'w') as openfile:
+            openfile.write('modified')
+        self.cache.restore('abcdef', self.path)
+        with open(output) as openfile:
+            self.assertEqual(openfile.read(), 'output')
+
+    def test_missing(self):
+        self.assertIsNone(self.cache.restore('abcdef', self.path))
+
+        output = os.path.join(self.path, 'output.txt')
+        with open(output, 'w') as openfile:
+            openfile.write('output')
+        self.cache.store('abcdef', ['output.txt'], [], self.path)
+        shutil.rmtree(os.path.join(self.root, 'cache', 'objects'))
+
+        os.unlink(output)
+        self.assertIsNone(self.cache.restore('abcdef', self.path))
+        self.assertFalse(os.path.exists(output))
+
+class TestCacheKey(TestCase):
+    def setUp(self):
+        self.project = Project({'bakefile.py': BAKEFILE, 'input.txt': 'input'})
+
+    def tearDown(self):
+        self.project.close()
+
+    def build(self, suffix='a'):
+        if self.project.exists('output.txt'):
+            self.project.remove('output.txt')
+        exitcode, output = self.project.invoke('-s', 'build.suffix=' + suffix, 'build')
+        self.assertEqual(exitcode, 0, output)
+        self.assertIn('building ' + suffix, output)
+        return 'restored from cache' in output
+
+    def test_restore(self):
+        self.assertFalse(self.build())
+        self.assertTrue(self.build())
+        self.assertEqual(self.project.read('output.txt'), 'inputa')
+
+    def test_input(self):
+        self.build()
+        self.project.write('input.txt', 'changed')
+        self.assertFalse(self.build())
+        self.assertEqual(self.project.read('output.txt'), 'changeda')
+
+    def test_environment(self):
+        self.build()
+        self.assertFalse(self.build('b'))
+        self.assertEqual(self.project.read('output.txt'), 'inputb')
+        self.assertTrue(self.build('a'))
+
+    def test_source(self):
+        self.build()
+        self.project.write('bakefile.py', BAKEFILE.replace('content +', 'content.upper() +'))
+        self.assertFalse(self.build())
+        self.assertEqual(self.project.read('output.txt'), 'INPUTa')
+
+    def test_hardlinked_output(self):
+        self.project.write('output.txt', 'previous')
+        os.link(os.path.join(self.project.path, 'output.txt'),
+            os.path.join(self.project.path, 'link.txt'))
+        self.project.touch('output.txt', -10)
+
+        exitcode, output = self.project.invoke('-s', 'build.suffix=a', 'build')
+        self.assertEqual(exitcode, 0, output)
+        self.assertEqual(self.project.read('link.txt'), 'inputa')
@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+from project import Project
+
+BAKEFILE = """
+    from bake import *
+
+    @task()
+    @parameter('target')
+    def build(runtime):
+        pass
+
+    @task()
+    def bundle(runtime):
+        pass
+
+    @task()
+    def test(runtime):
+        pass
+"""
+
+class TestComplete(TestCase):
+    def setUp(self):
+        self.project = Project({'bakefile.py': BAKEFILE})
+
+    def tearDown(self):
+        self.project.close()
+
+    def complete(self, *arguments):
+        exitcode, output = self.project.invoke('--complete', *arguments)
+        self.assertEqual(exitcode, 0, output)
+        return output.split()
+
+    def test_tasks(self):
+        self.assertEqual(self.complete('bu'), ['build', 'bundle'])
+        self.assertEqual(self.complete('t'), ['test'])
+        self.assertEqual(self.complete('x'), [])
+        self.assertEqual(self.complete('builder'), [])
+
+    def test_parameters(self):
+        self.assertEqual(self.complete('build', 'build'), ['build', 'build.target='])
+        self.assertEqual(self.complete('build', 'build.target=x'), [])
+
+    def test_options(self):
+        self.assertEqual(self.complete('--ver'), ['--verbose', '--version'])
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from bake.discovery import *
+
+from project import Project
+
+BAKEFILES = ('Bakefile', 'bakefile.py')
+
+ROOT_BAKEFILE = """
+    from bake import *
+
+    @task()
+    def build(runtime):
+        runtime.report('building root')
+"""
+
+SUBPROJECT_BAKEFILE = """
+    import os
+    from bake import *
+
+    @task()
+    def build(runtime):
+        runtime.report('building %(name)s in %%s' %% runtime.curdir)
+        runtime.shell(['pwd'], passthrough=True)
+        runtime.report('process cwd is %%s' %% os.getcwd())
+
+    @task()
+    @requires('build')
+    def test(runtime):
+        runtime.report('testing %(name)s')
+"""
+
+class TestFindSubprojects(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def create(self, *filenames):
+        for filename in filenames:
+            filename = os.path.join(self.root, filename)
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            open(filename, 'w').close()
+
+    def test_find(self):
+        self.create('Bakefile', 'services/api/Bakefile', 'services/api/bakefile.py',
+            'services/web/nested/bakefile.py', 'services/web/README', '.git/Bakefile',
+            'node_modules/package/Bakefile')
+
+        subprojects, entries = find_subprojects(self.root, BAKEFILES, {})
+        self.assertEqual(subprojects, {
+            'services/api': os.path.join(self.root, 'services', 'api', 'Bakefile'),
+            'services/web/nested': os.path.join(self.root, 'services', 'web', 'nested',
+                'bakefile.py'),
+        })
+
+        self.assertEqual(find_subprojects(self.root, BAKEFILES, entries), (subprojects, entries))
+
+        self.create('services/web/Bakefile')
+        subprojects, entries = find_subprojects(self.root, BAKEFILES, entries)
+        self.assertIn('services/web', subprojects)
+
+    def test_cached(self):
+        self.create('services/api/Bakefile')
+        subprojects, entries = find_subprojects(self.root, BAKEFILES, {})
+
+        entries['services/api'][1] = ['bakefile.py']
+        subprojects, entries = find_subprojects(self.root, BAKEFILES, entries)
+        self.assertEqual(subprojects['services/api'],
+            os.path.join(self.root, 'services', 'api', 'bakefile.py'))
+
+class TestSubprojects(TestCase):
+    def setUp(self):
+        self.project = Project({
+            'Bakefile': ROOT_BAKEFILE,
+            'services/api/Bakefile': SUBPROJECT_BAKEFILE % {'name': 'api'},
+            'services/web/Bakefile': SUBPROJECT_BAKEFILE % {'name': 'web'},
+        })
+
+    def tearDown(self):
+        self.project.close()
+
+    def invoke(self, *arguments):
+        exitcode, output = self.project.invoke('-M', *arguments)
+        self.assertEqual(exitcode, 0, output)
+        return output
+
+    def test_lookup(self):
+        output = self.invoke('build', 'services/api:build', 'web:build')
+        self.assertIn('building root', output)
+        self.assertIn('building api', output)
+        self.assertIn('building web', output)
+
+    def test_unknown(self):
+        exitcode, output = self.project.invoke('-M', 'missing:build')
+        self.assertNotEqual(exitcode, 0)
+        self.assertIn("cannot find task 'missing:build'", output)
+
+    def test_requirements(self):
+        output = self.invoke('api:test')
+        self.assertIn('building api', output)
+        self.assertIn('testing api', output)
+        self.assertNotIn('building root', output)
+        self.assertNotIn('web', output)
+
+    def test_curdir(self):
+        for arguments in ((), ('-j', '2')):
+            lines = [line.rstrip() for line in
+                self.invoke(*(arguments + ('api:build', 'web:build'))).splitlines()]
+            for name in ('api', 'web'):
+                path = os.path.join(self.project.path, 'services', name)
+                self.assertIn('[services/%s:build] building %s in %s' % (name, name, path),
+                    lines)
+                self.assertIn(path, lines)
+                self.assertIn('[services/%s:build] process cwd is %s' % (name,
+                    self.project.path), lines)
@@ -26,6 +26,53 @@ class TestEnvironment(TestCase):
         #    self.assertIsNone(env.find(invalid))
         #    self.assertTrue(env.find(invalid, True))
 
+        self.assertEqual(env.find('b.d.e'), 3)
+        self.assertEqual(env.find('b.d.c'), 2)
+        self.assertEqual(env.find('b.d.a'), 1)
+        self.assertEqual(env.find('x.y.a'), 1)
+        self.assertIsNone(env.find('b.d.z'))
+        self.assertTrue(env.find('b.d.z', True))
+
+    def test_stack(self):
+        stack = Environment({'a': 1, 'b': {'c': 2}}).overlay({'b': {'d': 3}})
+
+        self.assertEqual(stack.get('b.c'), 2)
+        self.assertEqual(stack.get('b.d'), 3)
+        self.assertEqual(stack.find('b.x.c'), 2)
+        self.assertTrue(stack.has('a'))
+        self.assertFalse(stack.has('b.z'))
+
+        stack.set('b.c', 4)
+        self.assertEqual(stack.get('b.c'), 4)
+
+    def test_stack_invalidation(self):
+        base = Environment({'a': 1})
+        stack = base.overlay().overlay({'b': 2})
+
+        self.assertEqual(stack.find('x.a'), 1)
+        self.assertFalse(stack.has('c'))
+
+        base.set('a', 3)
+        base.merge({'c': 4})
+        self.assertEqual(stack.find('x.a'), 3)
+        self.assertEqual(stack.get('c'), 4)
+
+    def test_stack_change_during_lookup(self):
+        top, bottom = Environment(), Environment({'a': 1})
+        stack = EnvironmentStack(top, bottom)
+        lookup = bottom._find
+
+        def racing(candidates, default=None):
+            value = lookup(candidates, default)
+            bottom._find = lookup
+            top.set('a', 2)
+            stack.find('b')
+            return value
+
+        bottom._find = racing
+        self.assertEqual(stack.find('a'), 1)
+        self.assertEqual(stack.find('a'), 2)
+
     def test_get(self):
         env = Environment({'a': 1, 'b': {'c': 2, 'd': {'e': 3}}})
 
@@ -0,0 +1,83 @@
+import os
+import py_compile
+from unittest import TestCase
+
+from project import Project
+
+BAKEFILE = """
+    from bake import *
+    import helper
+
+    print('importing bakefile')
+
+    @task()
+    def build(runtime):
+        runtime.report('building with %s' % helper.VALUE)
+"""
+
+HELPER = """
+    from bake import *
+
+    VALUE = %r
+
+    @task()
+    def helped(runtime):
+        runtime.report('helped')
+"""
+
+class TestManifest(TestCase):
+    def setUp(self):
+        self.project = Project({'bakefile.py': BAKEFILE, 'helper.py': HELPER % 'first'})
+        self.assertTrue(self.describe())
+
+    def tearDown(self):
+        self.project.close()
+
+    def describe(self):
+        """Describes the tasks of the project, returning whether the bakefile was imported."""
+
+        exitcode, output = self.project.invoke('-h')
+        self.assertEqual(exitcode, 0, output)
+        self.assertIn('build', output)
+        self.assertIn('helped', output)
+        return 'importing bakefile' in output
+
+    def test_deferred(self):
+        self.assertFalse(self.describe())
+
+        exitcode, output = self.project.invoke('-D', 'build', 'helped')
+        self.assertEqual(exitcode, 0, output)
+        self.assertIn('deferring load of %s' % os.path.join(self.project.path, 'bakefile.py'),
+            output)
+        self.assertIn('importing bakefile', output)
+        self.assertIn('building with first', output)
+        self.assertIn('helped', output)
+
+    def test_bakefile_changed(self):
+        self.project.write('bakefile.py', BAKEFILE.replace('building', 'built'))
+        self.assertTrue(self.describe())
+        self.assertFalse(self.describe())
+
+    def test_helper_changed(self):
+        self.project.write('helper.py', HELPER % 'second')
+        self.assertTrue(self.describe())
+        self.assertFalse(self.describe())
+
+        exitcode, output = self.project.invoke('build')
+        self.assertIn('building with second', output)
+
+    def test_sourceless_helper_changed(self):
+        self.compile_helper('second')
+        self.assertTrue(self.describe())
+        self.assertFalse(self.describe())
+
+        self.compile_helper('third')
+        self.assertTrue(self.describe())
+        exitcode, output = self.project.invoke('build')
+        self.assertIn('building with third', output)
+
+    def compile_helper(self, value):
+        self.project.write('helper.py', HELPER % value)
+        source = os.path.join(self.project.path, 'helper.py')
+        py_compile.compile(source, source + 'c', doraise=True)
+        os.unlink(source)
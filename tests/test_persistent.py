@@ -0,0 +1,58 @@
+import pickle
+from copy import deepcopy
+from unittest import TestCase
+
+from bake.environment import *
+from bake.persistent import *
+
+class TestPersistentMap(TestCase):
+    def test_immutable(self):
+        mapping = freeze({'a': {'b': 1}})
+        self.assertRaises(TypeError, mapping.__setitem__, 'a', 2)
+        self.assertRaises(TypeError, mapping['a'].update, {'c': 3})
+        self.assertRaises(TypeError, mapping.__ior__, {'c': 3})
+        self.assertIs(deepcopy(mapping), mapping)
+
+    def test_assoc_path(self):
+        original = freeze({'a': {'b': 1}, 'c': {'d': 2}})
+        derived = assoc_path(original, ('a', 'e', 'f'), 3)
+
+        self.assertEqual(original, {'a': {'b': 1}, 'c': {'d': 2}})
+        self.assertEqual(derived, {'a': {'b': 1, 'e': {'f': 3}}, 'c': {'d': 2}})
+        self.assertIs(derived['c'], original['c'])
+        self.assertRaises(ValueError, assoc_path, original, ('a', 'b', 'c'), 4)
+
+    def test_merge_maps(self):
+        original = freeze({'a': {'b': 1, 'c': 2}, 'd': {'e': 3}})
+        derived = merge_maps(original, {'a': {'b': 4}, 'f': 5})
+
+        self.assertEqual(derived, {'a': {'b': 4, 'c': 2}, 'd': {'e': 3}, 'f': 5})
+        self.assertEqual(original['a'], {'b': 1, 'c': 2})
+        self.assertIs(derived['d'], original['d'])
+
+    def test_pickle(self):
+        mapping = freeze({'a': {'b': 1}})
+        restored = pickle.loads(pickle.dumps(mapping, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(restored, mapping)
+        self.assertIsInstance(restored['a'], PersistentMap)
+
+class TestPersistentEnvironment(TestCase):
+    def test_environment(self):
+        env = PersistentEnvironment({'a': 1, 'b': {'c': 2}})
+        snapshot = env.snapshot()
+
+        env.set('b.d', 3)
+        env.merge({'b': {'c': 4}})
+        self.assertEqual(env.get('b'), {'c': 4, 'd': 3})
+        self.assertEqual(snapshot, {'a': 1, 'b': {'c': 2}})
+
+    def test_stack(self):
+        base = PersistentEnvironment({'a': {'b': 1, 'c': 2}})
+        layer = {'a': {'b': 3}}
+        stack = base.overlay(layer).overlay(d=4)
+
+        self.assertIsInstance(stack.stack[0], PersistentEnvironment)
+        self.assertIs(stack.stack[1].environment, layer)
+        self.assertEqual(stack.find('x.d'), 4)
+        self.assertEqual(stack.snapshot(), {'a': {'b': 3, 'c': 2}, 'd': 4})
+        self.assertEqual(base.get('a.b'), 1)
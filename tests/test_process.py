@@ -0,0 +1,103 @@
+import os
+from time import time
+from unittest import TestCase, skipIf
+
+from bake.process import *
+
+@skipIf(os.name != 'posix', 'requires a posix shell')
+class TestProcess(TestCase):
+    def test_output(self):
+        process = Process(['sh', '-c', 'cat; echo error >&2; exit 3'])
+        self.assertEqual(process('input\r\n'), 3)
+        self.assertEqual(process.stdout, 'input\n')
+        self.assertEqual(process.stderr, 'error\n')
+
+        process = Process(['pwd'])
+        process(cwd='/')
+        self.assertEqual(process.stdout, '/\n')
+
+    def test_timeout(self):
+        process = Process(['sh', '-c', 'trap "" TERM; sleep 10 & wait'])
+        process.grace = 0.2
+
+        started = time()
+        process(timeout=0.2)
+        self.assertTrue(process.timedout)
+        self.assertNotEqual(process.returncode, 0)
+        self.assertLess(time() - started, 5)
+
+    def test_run_processes(self):
+        processes = [Process(['sh', '-c', 'echo %d' % i]) for i in range(20)]
+        run_processes(processes, concurrency=5)
+        self.assertEqual([process.stdout for process in processes],
+            ['%d\n' % i for i in range(20)])
+
+        with self.assertRaises(ProcessFailedError):
+            run_processes([Process('true'), Process('false')])
+
+    def test_on_line(self):
+        lines = []
+        process = Process(['sh', '-c', 'printf "a\\r\\nb"; sleep 0.1; printf "c\\n"; echo d >&2'],
+            on_line=lambda line, stream: lines.append((line, stream)))
+        self.assertEqual(process(), 0)
+        self.assertEqual(sorted(lines), [('a', 'stdout'), ('bc', 'stdout'), ('d', 'stderr')])
+        self.assertIsNone(process.stdout)
+
+    def test_iterate(self):
+        process = Process(['sh', '-c', 'echo 1; echo 2 >&2; echo 3'])
+        self.assertEqual(list(process.iterate()), ['1', '3'])
+
+        process = Process('yes')
+        for i, line in enumerate(process.iterate()):
+            if i == 1000:
+                break
+        self.assertNotEqual(process.returncode, 0)
+
+    def test_capture(self):
+        process = Process(['sh', '-c', 'seq 1 20000; echo failed >&2; exit 2'],
+            capture=lambda: Capture(threshold=1024, tail=16))
+        self.assertEqual(process(), 2)
+
+        output = process.stdout
+        self.assertEqual(len(output), len(''.join('%d\n' % i for i in range(1, 20001))))
+        self.assertEqual(output.tail, b'19998\n19999\n20000\n'[-16:])
+        self.assertEqual(bytes(output.getbuffer()[:4]), b'1\n2\n')
+        self.assertEqual(output.open().readline(), b'1\n')
+        self.assertIn('failed', str(ProcessFailedError(2, process)))
+        output.close()
+
+        output = Capture(threshold=1024, tail=5)
+        output.write(u'\u00e9t\u00e9!'.encode('utf8'))
+        self.assertFalse(output.spilled)
+        self.assertEqual(bytes(output.getbuffer()), u'\u00e9t\u00e9!'.encode('utf8'))
+        self.assertTrue(output.decode(tail=True).endswith(u'!'))
+        output.close()
+
+    def test_pipeline(self):
+        pipeline = Pipeline([['printf', 'b\\na\\n'], 'sort', ['tr', 'a-z', 'A-Z']])
+        self.assertEqual(pipeline(), 0)
+        self.assertEqual(pipeline.stdout, 'A\nB\n')
+        self.assertEqual(pipeline.returncodes, [0, 0, 0])
+
+        pipeline = Pipeline([['sh', '-c', 'cat; exit 3'], ['sh', '-c', 'cat; echo e >&2']],
+            binary=True)
+        self.assertEqual(pipeline(b'\x00\xff'), 3)
+        self.assertEqual(pipeline.stdout, b'\x00\xff')
+        self.assertEqual(pipeline.returncodes, [3, 0])
+        self.assertEqual(pipeline.processes[1].stderr, 'e\n')
+
+        pipeline = Pipeline([['sleep', '10'], ['sleep', '10']])
+        pipeline(timeout=0.2)
+        self.assertTrue(pipeline.timedout)
+        self.assertNotIn(0, pipeline.returncodes)
+
+    @skipIf(not os.path.isdir('/proc/self/fd'), 'requires /proc/self/fd')
+    def test_pipeline_failed_start(self):
+        descriptors = sorted(os.listdir('/proc/self/fd'))
+        missing = ['/nonexistent/command']
+        for cmdlines in ([missing, ['cat']], [['cat'], missing, ['cat']]):
+            pipeline = Pipeline(cmdlines)
+            self.assertRaises(OSError, pipeline, b'data')
+            self.assertEqual(sorted(os.listdir('/proc/self/fd')), descriptors)
+            if pipeline.processes[0].process:
+                self.assertIsNotNone(pipeline.processes[0].returncode)
@@ -0,0 +1,41 @@
+import os
+import pstats
+import shutil
+import tempfile
+from unittest import TestCase
+
+from bake.profiling import *
+
+def work(count):
+    return sum(range(count))
+
+class TestProfiler(TestCase):
+    def test_profile(self):
+        directory = tempfile.mkdtemp()
+        try:
+            profiler = Profiler(directory)
+            self.assertEqual(profiler.profile('ns/task', work, 10), 45)
+            profiler.profile('ns/task', work, 20)
+
+            nested = Profiler()
+            self.assertEqual(nested.profile('ns/outer', nested.profile, 'ns/inner', work, 5), 10)
+            self.assertEqual(sorted(nested.stats), ['ns/outer'])
+
+            self.assertIn('work', profiler.summarize('ns/task'))
+            path, = profiler.write()
+            self.assertEqual(path, os.path.join(directory, 'ns.task.pstats'))
+            calls = pstats.Stats(path).total_calls
+
+            merging = Profiler(directory, merge=True)
+            merging.profile('ns/task', work, 10)
+            merging.write()
+            self.assertTrue(pstats.Stats(path).total_calls > calls)
+
+            with open(path, 'wb') as openfile:
+                openfile.write(b'corrupt')
+            reports = []
+            merging.write(reports.append)
+            self.assertIn(path, reports[0])
+            self.assertTrue(pstats.Stats(path).total_calls)
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,183 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from unittest import TestCase, skipIf
+
+from bake.environment import Environment
+from bake.exceptions import TaskFailed
+from bake.runtime import Runtime
+from bake.scheduler import *
+from bake.scheduler import execute_task
+from bake.task import Task
+
+from project import Project
+
+class Step(object):
+    def __init__(self, name, fails=False, raises=False, elapsed=None):
+        self.elapsed = elapsed
+        self.fails = fails
+        self.fullname = 'steps.%s' % name
+        self.name = name
+        self.raises = raises
+        self.usage = None
+
+    def __repr__(self):
+        return self.name
+
+class Mutate(Task):
+    name = 'mutate'
+
+    def run(self, runtime):
+        runtime.report('mutating in %d' % os.getpid())
+        runtime.environment.set('shared.value', runtime.environment.find('shared.value') + 1)
+        self.environment.set('mutate.value', 'set')
+
+PROCESS_BAKEFILE = """
+    import os
+    from bake import *
+
+    @task(executor='process')
+    def mutate(runtime):
+        runtime.report('mutating in %d' % os.getpid())
+        runtime.environment.set('shared.value', 'mutated')
+
+    @task(executor='process')
+    def fail(runtime):
+        raise TaskError('failing in worker')
+
+    @task()
+    @requires('mutate')
+    def check(runtime):
+        runtime.report('checking in %d' % os.getpid())
+        runtime.report('shared value is %s' % runtime.environment.find('shared.value'))
+"""
+
+class TestScheduler(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = os.path.join(self.root, 'cache')
+
+        self.executed = []
+        self.runtime = Runtime(path=self.root)
+        self.runtime.execute = self.execute
+
+    def tearDown(self):
+        if self.cache is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.cache
+        shutil.rmtree(self.root)
+
+    def execute(self, step, environment):
+        self.executed.append(step)
+        if step.raises:
+            raise ValueError(step.name)
+        if step.fails:
+            raise TaskFailed()
+
+    def test_dependencies(self):
+        a, b, c, d = Step('a'), Step('b'), Step('c'), Step('d')
+        graph = {a: set([b, c]), b: set([d]), c: set([d]), d: set()}
+        self.assertIsNone(Scheduler(self.runtime, graph, 2).run())
+
+        self.assertEqual(sorted(self.executed, key=repr), [a, b, c, d])
+        for step, dependencies in graph.items():
+            for dependency in dependencies:
+                self.assertLess(self.executed.index(dependency), self.executed.index(step))
+        self.assertEqual(sorted(self.runtime.completed, key=repr), [a, b, c, d])
+
+    def test_failure(self):
+        a, b, c = Step('a'), Step('b', fails=True), Step('c')
+        graph = {a: set([b]), b: set(), c: set()}
+        self.assertIs(Scheduler(self.runtime, graph, 1).run(), False)
+        self.assertEqual(self.executed, [b])
+        self.assertEqual(self.runtime.completed, [])
+
+    def test_exception(self):
+        a, b = Step('a'), Step('b', raises=True)
+        graph = {a: set([b]), b: set()}
+        with self.assertRaises(ValueError):
+            Scheduler(self.runtime, graph, 2).run()
+        self.assertEqual(self.executed, [b])
+
+    def test_priority(self):
+        for elapsed, expected in ((1.5, 'xzy'), (3.0, 'zxy')):
+            x, y, z = Step('x', elapsed=1.0), Step('y', elapsed=1.0), Step('z', elapsed=elapsed)
+            for step in (x, y, z):
+                self.runtime._record_duration(step)
+
+            self.executed = []
+            Scheduler(self.runtime, {x: set(), y: set([x]), z: set()}, 1).run()
+            self.assertEqual(''.join(step.name for step in self.executed), expected)
+
+    def test_unknown_duration(self):
+        x, y, z = Step('x', elapsed=1.0), Step('y', elapsed=2.5), Step('z')
+        for step in (x, y):
+            self.runtime._record_duration(step)
+
+        Scheduler(self.runtime, {x: set(), y: set(), z: set([x])}, 1).run()
+        self.assertEqual(self.executed, [x, y, z])
+
+    def test_curdir(self):
+        for name in ('a', 'b'):
+            os.mkdir(os.path.join(self.root, name))
+
+        changed, directories = {'a': threading.Event(), 'b': threading.Event()}, {}
+        def execute(step, environment):
+            self.runtime.chdir(step.name)
+            changed[step.name].set()
+            changed['b' if step.name == 'a' else 'a'].wait(5)
+            directories[step.name] = (str(self.runtime.curdir), os.getcwd())
+
+        cwd = os.getcwd()
+        self.runtime.execute = execute
+        a, b = Step('a'), Step('b')
+        Scheduler(self.runtime, {a: set(), b: set()}, 2).run()
+
+        self.assertEqual(directories, {'a': (os.path.join(self.root, 'a'), cwd),
+            'b': (os.path.join(self.root, 'b'), cwd)})
+        self.assertIsNone(getattr(self.runtime.local, 'path', None))
+
+class TestExecuteTask(TestCase):
+    def test_round_trip(self):
+        base = Environment({'shared': {'value': 1}})
+        settings = {'path': os.getcwd(), 'timestamps': False}
+        payload = pickle.dumps((Mutate.fullname, None, Environment().snapshot(),
+            base.snapshot(), settings, os.getcwd(), False, False))
+
+        result = execute_task(payload)
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual(result['messages'], [('mutating in %d' % os.getpid(), False)])
+        self.assertEqual(result['runtime'], {'shared': {'value': 2}})
+        self.assertEqual(result['environment'], {'mutate': {'value': 'set'}})
+
+@skipIf(not hasattr(os, 'fork'), 'requires fork')
+class TestProcessPool(TestCase):
+    def setUp(self):
+        self.project = Project({'bakefile.py': PROCESS_BAKEFILE})
+
+    def tearDown(self):
+        self.project.close()
+
+    def assertExecutedInWorker(self, *arguments):
+        exitcode, output = self.project.invoke(*arguments)
+        self.assertEqual(exitcode, 0, output)
+        self.assertIn('shared value is mutated', output)
+
+        pids = dict(line.split()[1:4:2] for line in output.splitlines() if ' in ' in line)
+        self.assertNotEqual(pids['mutating'], pids['checking'])
+
+    def test_serial(self):
+        self.assertExecutedInWorker('check')
+
+    def test_concurrent(self):
+        self.assertExecutedInWorker('-j', '2', 'check')
+
+    def test_failure(self):
+        exitcode, output = self.project.invoke('fail')
+        self.assertNotEqual(exitcode, 0)
+        self.assertIn('failing in worker', output)
+        self.assertIn('task failed', output)
@@ -0,0 +1,62 @@
+from unittest import TestCase
+
+from project import Project
+
+BAKEFILE = """
+    from bake import *
+
+    @task(inputs=['src/*.txt'], outputs=['build/output.txt'])
+    def build(runtime):
+        runtime.report('building')
+        runtime.shell(['sh', '-c', 'mkdir -p build && cat src/*.txt > build/output.txt'])
+"""
+
+class TestOutputs(TestCase):
+    def setUp(self):
+        self.project = Project({'bakefile.py': BAKEFILE, 'src/a.txt': 'a', 'src/b.txt': 'b'})
+        self.assertTrue(self.build())
+        for name in ('src/a.txt', 'src/b.txt'):
+            self.project.touch(name, -10)
+
+    def tearDown(self):
+        self.project.close()
+
+    def build(self, *arguments):
+        exitcode, output = self.project.invoke(*(arguments + ('build',)))
+        self.assertEqual(exitcode, 0, output)
+        if 'task up to date' in output:
+            self.assertNotIn('building', output)
+            return False
+        self.assertIn('building', output)
+        return True
+
+    def test_uptodate(self):
+        self.assertFalse(self.build())
+        self.assertEqual(self.project.read('build/output.txt'), 'ab')
+
+    def test_changed_input(self):
+        self.project.write('src/a.txt', 'changed')
+        self.project.touch('src/a.txt', 10)
+        self.assertTrue(self.build())
+        self.assertEqual(self.project.read('build/output.txt'), 'changedb')
+        self.assertFalse(self.build())
+
+    def test_unchanged_input(self):
+        self.project.touch('src/a.txt', 20)
+        self.assertFalse(self.build())
+
+    def test_added_input(self):
+        self.project.write('src/c.txt', 'c')
+        self.project.touch('src/c.txt', 10)
+        self.assertTrue(self.build())
+        self.assertEqual(self.project.read('build/output.txt'), 'abc')
+
+    def test_missing_output(self):
+        self.project.remove('build/output.txt')
+        self.assertTrue(self.build())
+        self.assertTrue(self.project.exists('build/output.txt'))
+
+    def test_force(self):
+        self.assertTrue(self.build('-F'))
+        self.assertTrue(self.build('--force'))
+        self.assertFalse(self.build())
@@ -0,0 +1,47 @@
+import json
+import os
+import shutil
+import tempfile
+from threading import Thread
+from unittest import TestCase
+
+from bake.trace import *
+
+class TestTracer(TestCase):
+    def test_write(self):
+        tracer = Tracer()
+        with tracer.span('outer', 'task', target='value') as span:
+            with tracer.span('inner'):
+                pass
+            span.annotate(usage={'user': 0.5})
+
+        thread = Thread(target=lambda: tracer.span('threaded').__enter__().__exit__(None, None,
+            None))
+        thread.start()
+        thread.join()
+
+        with self.assertRaises(ValueError):
+            with tracer.span('failed'):
+                raise ValueError()
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'trace.json')
+            tracer.write(path)
+            with open(path) as openfile:
+                events = json.load(openfile)['traceEvents']
+        finally:
+            shutil.rmtree(directory)
+
+        spans = dict((event['name'], event) for event in events if event['ph'] == 'X')
+        self.assertEqual(sorted(spans), ['failed', 'inner', 'outer', 'threaded'])
+        self.assertEqual(spans['outer']['args'], {'target': 'value', 'usage': {'user': 0.5}})
+        self.assertIn('exception', spans['failed']['args'])
+        self.assertNotEqual(spans['threaded']['tid'], spans['outer']['tid'])
+
+        outer, inner = spans['outer'], spans['inner']
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertLessEqual(inner['ts'] + inner['dur'], outer['ts'] + outer['dur'])
+
+        lanes = [event for event in events if event['name'] == 'thread_name']
+        self.assertEqual(len(lanes), 2)
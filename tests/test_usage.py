@@ -0,0 +1,23 @@
+from unittest import TestCase, skipIf
+
+from bake.usage import *
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+@skipIf(not resource, 'requires resource')
+class TestUsage(TestCase):
+    def test_measure(self):
+        started = measure_usage()
+        sum(i * i for i in range(200000))
+        usage = subtract_usage(started, measure_usage())
+
+        self.assertGreater(usage['user'] + usage['system'], 0)
+        self.assertGreater(usage['maxrss'], 0)
+        self.assertIn('cpu', format_usage(usage))
+
+    def test_unavailable(self):
+        self.assertIsNone(subtract_usage(None, measure_usage()))
+        self.assertEqual(format_usage(None), '')
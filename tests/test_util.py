@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from bake.exceptions import TaskError
+from bake.util import *
+
+class TestTopologicalSort(TestCase):
+    def test_sort(self):
+        graph = {'a': set(['b', 'c']), 'b': set(['d']), 'c': set(['d']), 'd': set(), 'e': set()}
+        result = topological_sort(graph)
+
+        self.assertEqual(sorted(result), ['a', 'b', 'c', 'd', 'e'])
+        for node, edges in graph.items():
+            for target in edges:
+                self.assertLess(result.index(target), result.index(node))
+
+        self.assertEqual(graph['a'], set(['b', 'c']))
+
+    def test_empty(self):
+        self.assertEqual(topological_sort({}), [])
+
+    def test_cycle(self):
+        graph = {'a': set(['b']), 'b': set(['c']), 'c': set(['a']), 'd': set(['a'])}
+        with self.assertRaises(TaskError) as context:
+            topological_sort(graph)
+
+        cycle = context.exception.args[0].split(': ', 1)[1].split(' -> ')
+        self.assertEqual(cycle[0], cycle[-1])
+        self.assertEqual(sorted(cycle[:-1]), ['a', 'b', 'c'])
+        for node, target in zip(cycle, cycle[1:]):
+            self.assertIn(target, graph[node])
+
+    def test_self_cycle(self):
+        with self.assertRaises(TaskError) as context:
+            topological_sort({'a': set(['a'])})
+        self.assertEqual(context.exception.args[0], 'circular dependency: a -> a')
+
+class TestExpandGlobs(TestCase):
+    def test_path(self):
+        directory = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(directory, 'src', 'sub'))
+            for name in ('a.py', 'sub/b.py'):
+                open(os.path.join(directory, 'src', name), 'w').close()
+
+            self.assertEqual(expand_globs(['src/*.py'], path=directory), ['src/a.py'])
+            self.assertEqual(expand_globs(['src/**'], path=directory),
+                ['src/a.py', 'src/sub/b.py'])
+            self.assertIsNone(expand_globs(['src/sub'], True, directory))
+            absolute = os.path.join(directory, 'src', 'a.py')
+            self.assertEqual(expand_globs([absolute], path=directory), [absolute])
+            self.assertIsNone(expand_globs(['missing'], True, directory))
+        finally:
+            shutil.rmtree(directory)
+
+class TestBoundedCache(TestCase):
+    def test_eviction(self):
+        cache = BoundedCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+        cache.clear()
+        self.assertEqual(cache.get('a', 0), 0)
+
+class TestCompileSource(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = os.path.join(self.directory, 'cache')
+        self.path = os.path.join(self.directory, 'bakefile.py')
+
+    def tearDown(self):
+        if self.cache is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = self.cache
+        shutil.rmtree(self.directory)
+
+    def evaluate(self, source=None, mtime=None):
+        if source is not None:
+            with open(self.path, 'w') as openfile:
+                openfile.write(source)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+        namespace = {}
+        exec(compile_source(self.path), namespace)
+        return namespace['value']
+
+    def test_recompile(self):
+        self.assertEqual(self.evaluate('value = 1\n', 1000000000), 1)
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, 'cache', 'bake',
+            'bytecode'))), 1)
+        self.assertEqual(self.evaluate(), 1)
+
+        self.assertEqual(self.evaluate('value = 22\n', 1000000000), 22)
+        self.assertEqual(self.evaluate('value = 33\n', 1000000000), 22)
+        self.assertEqual(self.evaluate('value = 33\n', 1000000001), 33)
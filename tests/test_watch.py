@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipIf
+
+from bake.watch import *
+
+try:
+    InotifyWatcher(tempfile.gettempdir()).close()
+except (AttributeError, OSError):
+    INOTIFY = False
+else:
+    INOTIFY = True
+
+@skipIf(not INOTIFY, 'requires inotify')
+class TestInotifyWatcher(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.watcher = InotifyWatcher(self.root, debounce=0.05)
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.root)
+
+    def test_discard(self):
+        for i in range(3000):
+            with open(os.path.join(self.root, 'output%04d.txt' % i), 'w') as openfile:
+                openfile.write('output')
+
+        self.watcher.discard()
+        self.assertEqual(self.watcher.collect(0), set())
+
+        with open(os.path.join(self.root, 'input.txt'), 'w') as openfile:
+            openfile.write('input')
+        self.assertEqual(self.watcher.wait(), set([os.path.join(self.root, 'input.txt')]))
+
+    def test_ignored(self):
+        for i in range(3000):
+            with open(os.path.join(self.root, 'output%04d.txt~' % i), 'w') as openfile:
+                openfile.write('output')
+        with open(os.path.join(self.root, 'input.txt'), 'w') as openfile:
+            openfile.write('input')
+        self.assertEqual(self.watcher.collect(0), set([os.path.join(self.root, 'input.txt')]))